@@ -1,26 +1,48 @@
-from packet import Packet
-from timeout_calculator import TimeoutCalculator
+import math
 
-# Structure to store information associated with an unacked packet
-# so that we can maintain a list of such UnackedPacket objects
+import event_trace
+from congestion_control import Cubic, Reno, Vegas
+from pacing import Pacer
+from packet import PacketPool
+from reorder_buffer import ReorderBuffer
+from timeout_calculator import TimeoutCalculator
+from unacked_table import UnackedTable
 
 
 class AimdHost:
     """
-    This class implements a host that follows the AIMD protocol.
+    This class implements a host that follows the AIMD protocol, or whichever
+    congestion controller it is given (see congestion_control.py).
     Data members of this class are
 
-    **unacked**: List of unacked packets
+    **unacked**: Unacked packets, an UnackedTable indexed by seq_num and timeout_tick
+
+    **controller**: Congestion controller deciding the window, Reno (AIMD) by
+    default
 
-    **window**: Size of the window at any given moment
+    **window**: Size of the window at any given moment (the controller's)
 
     **max_seq**: Maximum sequence number sent so far
 
-    **in_order_rx_seq**: Maximum sequence number received so far
+    **in_order_rx_seq**: Maximum sequence number received so far in order
+
+    **reorder_buffer**: A ReorderBuffer of the packets received out of order,
+    which also provides SACK-style blocks of them
+
+    **fast_retransmit**: Whether losses are also detected from the SACK blocks
+    of the reorder_buffer, instead of only by timeouts
 
-    **slow_start**: Boolean to indicate whether algorithm is in slow start or not
+    **in_recovery**: Whether the host is in fast recovery, which lasts until
+    everything up to recovery_point (max_seq when it started) is received
 
-    **next_decrease**: Time (in ticks) at which the window size should be decreased
+    **lost**: Sequence numbers detected as lost, to be retransmitted by the next
+    send()
+
+    **pacer**: A Pacer spreading new packets over the smoothed RTT if a
+    pacing_gain is given (see pacing.py), or None to send the free window at once
+
+    **packet_pool**: PacketPool that new packets are taken from and that acked
+    ones are given back to. A retransmission resends the unacked packet itself.
 
     **timeout_calculator**: An object of class TimeoutCalculator
     (Refer to TimeoutCalculator class for more information)
@@ -29,31 +51,64 @@ class AimdHost:
     and receiving packets respectively. All send and receive logic should be written
     within one of these two functions.
 
+    Fast retransmit: a packet is considered lost as soon as DUPACK_THRESHOLD
+    packets sent after it have been received (SACKed), like three duplicate ACKs
+    in TCP. It is retransmitted on the next tick, without backing off the timer
+    or going back to slow start, and the controller decreases the window subject
+    to the same hysteresis as after a timeout. New packets keep flowing during
+    the recovery, as the SACKed packets leave the window. A packet whose fast
+    retransmission is lost as well is recovered by its timeout.
     """
 
+    # Number of packets received beyond a hole before it is considered lost
+    DUPACK_THRESHOLD = 3
+
     def __init__(
         self,
         verbose=True,
         min_timeout=TimeoutCalculator.MIN_TIMEOUT,
         max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+        tracer=None,
+        pacing_gain=None,
+        fast_retransmit=True,
+        controller=None,
     ):
-        # list of unacked packets
-        self.unacked = []
-        self.window = 1
-        # We'll initialize window to 1
+        # unacked packets, indexed by seq_num and by timeout_tick
+        self.unacked = UnackedTable()
+        # Owns the window, which starts at 1, and slow start
+        self.controller = Reno() if controller is None else controller
         self.max_seq = -1
         # maximum sequence number sent so far
         self.in_order_rx_seq = -1
         # maximum sequence number received so far in order
-        # Are we in slow start?
-        self.slow_start = True
-        # When to next decrease your window; adds some hystersis
-        self.next_decrease = -1
+        # packets received out of order, with SACK-style blocks of them
+        self.reorder_buffer = ReorderBuffer()
+        # Whether to detect losses from SACK blocks as well as timeouts
+        self.fast_retransmit = fast_retransmit
+        # Fast recovery, which ends once recovery_point is received in order
+        self.in_recovery = False
+        self.recovery_point = -1
+        # Sequence numbers to fast-retransmit on the next send()
+        self.lost = []
+        # Holes below this sequence number have already been marked lost
+        self.lost_up_to = 0
+        # Where new packets come from and acked ones go back to; the Simulator
+        # replaces it with its own
+        self.packet_pool = PacketPool()
+        # Spreads new packets over the smoothed RTT, if pacing_gain is given
+        self.pacer = None if pacing_gain is None else Pacer(pacing_gain)
         # Whether to print output
         self.verbose = verbose
+        # Where to record events; echoes them as text if verbose
+        self.tracer = event_trace.default_tracer(tracer, verbose)
+        # Called as rtt_observer(tick, rtt_sample) at the end of recv(), if set
+        self.rtt_observer = None
         # object for computing timeouts
         self.timeout_calculator = TimeoutCalculator(
-            verbose=verbose, min_timeout=min_timeout, max_timeout=max_timeout
+            verbose=verbose,
+            min_timeout=min_timeout,
+            max_timeout=max_timeout,
+            tracer=self.tracer,
         )
 
     def send(self, tick):
@@ -72,78 +127,77 @@ class AimdHost:
 
             A list of packets that the host wants to transmit on to the network
         """
-        if self.verbose:
-            print("@ tick " + str(tick) + " window is " + str(self.window))
+        if self.tracer.enabled:
+            self.tracer.record(event_trace.WINDOW, tick, value=self.window)
 
         # TODO: Create an empty list of packets that the host will send
         pkts = []
         # First, process retransmissions
-        for i in range(0, len(self.unacked)):
-            unacked_pkt = self.unacked[i]
-            if tick >= unacked_pkt.timeout_tick:
-                if self.verbose:
-                    print(
-                        "@ "
-                        + str(tick)
-                        + " timeout for unacked_pkt "
-                        + str(unacked_pkt.seq_num)
-                        + " timeout duration was "
-                        + str(unacked_pkt.timeout_duration)
-                    )
-                # TODO: Retransmit any packet that has timed out
-
-                # by doing the following in order
-                # (1) creating a new packet,
-                pkt = Packet(tick , unacked_pkt.seq_num)
-                # (2) Incrementing num_retx (for debugging purposes)
-                pkt.num_retx +=1
-                # (3) Append the packet to the list of packets created earlier
-                pkts.append(pkt)
-                # (4) Backing off the timer
-                self.timeout_calculator.exp_backoff () 
-                # (5) Updating timeout_tick and timeout_duration appropriately after backing off the timer
-                # unacked_pkt.timeout_tick = self.timeout_calculator.update_timeout(tick)
-                pkt.timeout_duration = tick - unacked_pkt.timeout_tick #not sure at all
-                pkt.timeout_tick =  tick + pkt.timeout_duration
-                
-                if self.verbose:
-                    print(
-                        "@ "
-                        + str(tick)
-                        + " exp backoff for packet "
-                        + str(unacked_pkt.seq_num)
-                    )
-                # TODO: Multiplicative decrease, if it's time for the next decrease
-                if (tick == self.next_decrease):
-                    # Cut window by half, but don't let it go below 1
-                    self.window /=2
-                    if self.window < 1:
-                        self.window =1
-                    # TODO: Make sure the next multiplicative decrease doesn't happen until an RTT later
-                    self.next_decrease = tick + self.timeout_calculator.mean_rtt
-                
-                # (use the timeout_calculator to estimate the RTT)
-
-
-                # Exit slow start, whether you were in it or not
-                self.slow_start = False
-
-            self.unacked[i] = unacked_pkt
-
-        # Now fill up the window with new packets
+        for unacked_pkt in self.unacked.pop_expired(tick):
+            if self.tracer.enabled:
+                self.tracer.record(
+                    event_trace.TIMEOUT,
+                    tick,
+                    unacked_pkt.seq_num,
+                    unacked_pkt.timeout_duration,
+                )
+            # TODO: Retransmit any packet that has timed out
+
+            # by doing the following in order
+            # (1) resending the unacked packet itself; the link only copies its
+            # fields, so no new packet is needed
+            unacked_pkt.sent_ts = tick
+            # (2) Incrementing num_retx (for debugging purposes)
+            unacked_pkt.num_retx += 1
+            # (3) Append the packet to the list of packets created earlier
+            pkts.append(unacked_pkt)
+            # (4) Backing off the timer
+            self.timeout_calculator.exp_backoff(tick)
+            # (5) Updating timeout_tick and timeout_duration appropriately after backing off the timer
+            unacked_pkt.timeout_duration = self.timeout_calculator.timeout
+            self.unacked.reschedule(unacked_pkt, tick + unacked_pkt.timeout_duration)
+
+            if self.tracer.enabled:
+                self.tracer.record(event_trace.BACKOFF, tick, unacked_pkt.seq_num)
+            # Multiplicative decrease, if it's time for the next decrease, and
+            # exit slow start, whether you were in it or not
+            self.controller.on_loss(tick, self.timeout_calculator.mean_rtt)
+
+        # Then fast-retransmit the packets detected as lost by recv()
+        for seq_num in self.lost:
+            unacked_pkt = self.unacked.get(seq_num)
+            if unacked_pkt is None:
+                # ACKed in the meantime
+                continue
+            unacked_pkt.sent_ts = tick
+            unacked_pkt.num_retx += 1
+            pkts.append(unacked_pkt)
+            # The timer restarts, without backing off
+            unacked_pkt.timeout_duration = self.timeout_calculator.timeout
+            self.unacked.reschedule(unacked_pkt, tick + unacked_pkt.timeout_duration)
+            if self.tracer.enabled:
+                self.tracer.record(event_trace.FAST_RETX, tick, seq_num, self.window)
+        self.lost = []
+
+        # Now fill up the window with new packets, as far as pacing allows
         while len(self.unacked) < self.window:
+            if self.pacer is not None and not self.pacer.allow(tick):
+                break
             # TODO: Replace this break
 
 
             #break
             # TODO: Create new packets, set their retransmission timeout, and transmit them
-            new_pkt = Packet (tick, self.max_seq+1)
+            new_pkt = self.packet_pool.acquire(tick, self.max_seq + 1)
+            new_pkt.timeout_duration = self.timeout_calculator.timeout
             new_pkt.timeout_tick = self.timeout_calculator.timeout + tick
-
+            pkts.append(new_pkt)
 
             # TODO: Remember to update self.max_seq and add the just sent packet to self.unacked
             self.max_seq = new_pkt.seq_num
-            self.unacked.append(new_pkt)
+            self.unacked.add(new_pkt)
+            if self.pacer is not None:
+                self.pacer.sent(tick, self.window, self.timeout_calculator)
 
         # TODO: Return the list of packets that need to be sent on to the network
         return pkts
@@ -167,27 +221,111 @@ class AimdHost:
 
 
 
-        # TODO: Remove received packet from self.unacked
-        for i in range(0, len(self.unacked)):
-            unacked_pkt = self.unacked[i]
-            if unacked_pkt.seq_num == pkt.seq_num:
-                self.unacked.pop(i)
+        # Remove the received packet from self.unacked and recycle it
+        acked_pkt = self.unacked.remove(pkt.seq_num)
+        if acked_pkt is not None:
+            self.packet_pool.release(acked_pkt)
 
         # TODO: Update in_order_rx_seq to reflect the largest sequence number that you
-        # have received in order so far
-        
-        #or 
-        # self.in_order_rx_seq = pkt.seq_num
-        if pkt.seq_num == self.in_order_rx_seq +1:
-            self.in_order_rx_seq +=1
-
-        # TODO: Increase your window given that you just received an ACK. Remember that:
-        # 1. The window increase rule is different for slow start and congestion avoidance.
-        if (self.slow_start):
-            self.window +=1
-        #congestion control
-        else:
-            self.window += (1/self.window)
-
-
-        # 2. The recv() function is called on every ACK (not every RTT), so you should adjust your window accordingly.
+        # have received in order so far. Packets that arrived out of order
+        # before a retransmission count as soon as the gap is filled.
+        self.reorder_buffer.add(pkt.seq_num)
+        self.in_order_rx_seq = self.reorder_buffer.in_order_seq
+
+        # Increase your window given that you just received an ACK
+        self.controller.on_ack(tick, rtt_sample, self.timeout_calculator.mean_rtt)
+
+        if self.fast_retransmit:
+            if self.in_recovery and self.in_order_rx_seq >= self.recovery_point:
+                self.in_recovery = False
+            if self.reorder_buffer.buffered >= self.DUPACK_THRESHOLD:
+                self.detect_losses(tick)
+
+        if self.rtt_observer is not None:
+            self.rtt_observer(tick, rtt_sample)
+
+    @property
+    def window(self):
+        return self.controller.window
+
+    @window.setter
+    def window(self, value):
+        self.controller.window = value
+
+    def detect_losses(self, tick):
+        """
+        Mark as lost every unacked packet in a hole of the reorder_buffer with
+        at least DUPACK_THRESHOLD packets received beyond it, and enter fast
+        recovery if not in it yet. Every hole is only marked once, so a lost
+        fast retransmission is left to its timeout.
+
+        Args:
+
+            **tick**: Simulated time
+        """
+        # packets received beyond the current hole
+        beyond = self.reorder_buffer.buffered
+        hole_start = self.in_order_rx_seq + 1
+        for first, last in self.reorder_buffer.sack_blocks():
+            if beyond < self.DUPACK_THRESHOLD:
+                break
+            for seq_num in range(max(hole_start, self.lost_up_to), first):
+                if seq_num in self.unacked:
+                    self.lost.append(seq_num)
+            self.lost_up_to = max(self.lost_up_to, first)
+            beyond -= last - first + 1
+            hole_start = last + 1
+        if self.lost and not self.in_recovery:
+            self.in_recovery = True
+            self.recovery_point = self.max_seq
+            self.controller.on_loss(tick, self.timeout_calculator.mean_rtt)
+
+    def next_event_tick(self, tick):
+        """
+        Earliest tick at or after tick at which send() could transmit a packet,
+        assuming no packet is received in the meantime. That is either now, if
+        packets are to be fast-retransmitted, when the window has room for new
+        packets (now, or when pacing allows the next one), or when the first
+        unacked packet times out.
+
+        Args:
+
+            **tick**: Simulated time
+
+        Returns:
+
+            The tick at which the host next needs to be woken up, or None if
+            there is nothing outstanding
+        """
+        if self.lost:
+            return tick
+        wakeup = None
+        if len(self.unacked) < self.window:
+            if self.pacer is None:
+                return tick
+            wakeup = self.pacer.next_event_tick(tick)
+        first_timeout = self.unacked.next_timeout()
+        if first_timeout is not None:
+            timeout_tick = max(tick, math.ceil(first_timeout))
+            if wakeup is None or timeout_tick < wakeup:
+                wakeup = timeout_tick
+        return wakeup
+
+
+class CubicHost(AimdHost):
+    """
+    AimdHost with CUBIC congestion control (see congestion_control.Cubic).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(controller=Cubic(), **kwargs)
+
+
+class VegasHost(AimdHost):
+    """
+    AimdHost with delay-based congestion control that keeps the link's queue
+    short (see congestion_control.Vegas).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(controller=Vegas(), **kwargs)
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Lockstep simulation of many independent replicas of the Simulator pipeline
+(SlidingWindowHost or AimdHost, Link and DelayBox) as NumPy arrays.
+
+Monte-Carlo studies run the same configuration many times with different seeds
+or window sizes. BatchSimulator advances R such replicas together. Every piece
+of per-replica state is held in arrays with one row per replica: the host's
+window and sequence numbers, its unacked packets, its TimeoutCalculator (a
+BatchTimeoutCalculator), the link queue and the packets inside the pdbox. One
+tick is then a fixed number of vector operations, no matter how many replicas
+there are.
+
+The replicas follow Simulator.tick() step by step, and each one draws its
+losses from the same random number stream that Simulator would derive from
+its seed. The final state of replica i is therefore identical to a Simulator
+run with the same parameters (see make_simulator() and the --check option).
+
+The replicas share rtt_min, capacity and the timeout limits. Window size, loss
+ratio, queue limit and seed can differ per replica. Jitter and the other loss
+models are not supported. AIMD replicas detect losses by timeout only, i.e.,
+they match AimdHost(fast_retransmit=False).
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from batch_timeout_calculator import BatchTimeoutCalculator
+from hosts import create_host
+from simulator import Simulator
+from timeout_calculator import TimeoutCalculator
+
+# Number of loss decisions drawn from each replica's generator at a time. The
+# stream of numbers does not depend on it, only the memory used per replica.
+BLOCK_SIZE = 256
+
+# Results reported by BatchSimulator.results(), one array entry per replica
+RESULTS = [
+    "in_order_rx_seq",
+    "max_seq",
+    "window",
+    "timeout",
+    "mean_rtt",
+    "sent",
+    "retransmitted",
+    "queue_dropped",
+    "link_dropped",
+    "delivered",
+]
+
+
+def ranks(groups):
+    # Position of each element within its run of equal values; groups is sorted
+    return np.arange(len(groups)) - np.searchsorted(groups, groups)
+
+
+def next_power_of_two(n):
+    return 1 << max(0, int(n) - 1).bit_length()
+
+
+class BatchSimulator:
+    """
+    R replicas of Simulator with a SlidingWindowHost or an AimdHost, advanced in
+    lockstep. window_sizes, loss_ratios, queue_limits and seeds are scalars or
+    sequences of length R (window_sizes is ignored for AIMD). Data members of
+    this class are
+
+    **window**: Window of each replica
+
+    **max_seq**: Maximum sequence number sent by each replica
+
+    **in_order_rx_seq**: Maximum sequence number received in order by each
+    replica (a property, see below)
+
+    **timeout_calculator**: A BatchTimeoutCalculator with one flow per replica
+
+    **unacked_seq**, **unacked_timeout**: Unacked packets, an
+    (R, unacked_capacity) hash table indexed by seq_num % unacked_capacity,
+    with each packet's timeout_tick. Empty entries have seq_num -1 and
+    timeout_tick inf.
+
+    **outstanding**: Number of unacked packets of each replica
+
+    **earliest**: Lower bound on the earliest timeout_tick of each replica's
+    unacked packets; replicas are only scanned for timeouts once it is reached
+
+    **queue_seq**, **queue_sent**: Link queue of each replica, a ring of
+    queue_size packets starting at queue_head
+
+    **pdbox_seq**, **pdbox_sent**, **pdbox_valid**: Packets inside the pdbox,
+    indexed by tick % delay, position within the tick and replica
+
+    Per-replica state is updated with operations over all R replicas at once,
+    masked to the replicas concerned, and the tables are addressed through
+    flat indices, which is much cheaper in NumPy than gathering scattered rows.
+    """
+
+    def __init__(
+        self,
+        host_type,
+        window_sizes,
+        loss_ratios,
+        queue_limits,
+        rtt_min,
+        seeds,
+        capacity=1,
+        min_timeout=TimeoutCalculator.MIN_TIMEOUT,
+        max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+    ):
+        if host_type not in ["slidingwindow", "aimd"]:
+            raise ValueError("BatchSimulator supports slidingwindow and aimd hosts only")
+        if rtt_min < 2:
+            raise ValueError("rtt_min must be at least 2")
+        self.host_type = host_type
+        self.seeds = np.atleast_1d(np.asarray(seeds, dtype=np.int64))
+        replicas = len(self.seeds)
+        self.replicas = replicas
+        self.rtt_min = rtt_min
+        self.capacity = capacity
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        # index of each replica, and of the first entry of its row in the tables
+        self.rows = np.arange(replicas, dtype=np.int64)
+
+        # host state
+        self.aimd = host_type == "aimd"
+        if self.aimd:
+            self.window_sizes = np.full(replicas, None)
+            self.window = np.ones(replicas)
+        else:
+            if window_sizes is None:
+                raise ValueError("window_size must be defined for host_type SlidingWindow")
+            self.window_sizes = np.broadcast_to(window_sizes, (replicas,)).astype(np.int64)
+            self.window = self.window_sizes.astype(float)
+        self.max_seq = np.full(replicas, -1, dtype=np.int64)
+        self.slow_start = np.ones(replicas, dtype=bool)
+        self.next_decrease = np.full(replicas, -1.0)
+        self.timeout_calculator = BatchTimeoutCalculator(replicas, min_timeout, max_timeout)
+
+        # unacked packets
+        self.unacked_capacity = next_power_of_two(max(64, 2 * self.window.max()))
+        self.unacked_seq = np.full((replicas, self.unacked_capacity), -1, dtype=np.int64)
+        self.unacked_timeout = np.full((replicas, self.unacked_capacity), np.inf)
+        self.outstanding = np.zeros(replicas, dtype=np.int64)
+        self.earliest = np.full(replicas, np.inf)
+
+        # link queue
+        self.queue_limit = np.broadcast_to(queue_limits, (replicas,)).astype(np.int64)
+        self.queue_capacity = 64
+        self.queue_seq = np.zeros((replicas, self.queue_capacity), dtype=np.int64)
+        self.queue_sent = np.zeros((replicas, self.queue_capacity), dtype=np.int64)
+        self.queue_head = np.zeros(replicas, dtype=np.int64)
+        self.queue_size = np.zeros(replicas, dtype=np.int64)
+
+        # link losses, from the same streams as Link's BernoulliLoss in Simulator
+        self.loss_ratio = np.broadcast_to(loss_ratios, (replicas,)).astype(float)
+        self.lossy = self.loss_ratio != 0
+        self.rngs = [
+            np.random.default_rng(np.random.SeedSequence(int(seed)).spawn(2)[0])
+            for seed in self.seeds
+        ]
+        self.loss_block = np.zeros((replicas, BLOCK_SIZE))
+        self.loss_index = np.full(replicas, BLOCK_SIZE, dtype=np.int64)
+
+        # pdbox
+        self.delay = rtt_min - 1
+        self.pdbox_seq = np.zeros((self.delay, capacity, replicas), dtype=np.int64)
+        self.pdbox_sent = np.zeros((self.delay, capacity, replicas), dtype=np.int64)
+        self.pdbox_valid = np.zeros((self.delay, capacity, replicas), dtype=bool)
+
+        # counters
+        self.sent = np.zeros(replicas, dtype=np.int64)
+        self.retransmitted = np.zeros(replicas, dtype=np.int64)
+        self.queue_dropped = np.zeros(replicas, dtype=np.int64)
+        self.link_dropped = np.zeros(replicas, dtype=np.int64)
+        self.delivered = np.zeros(replicas, dtype=np.int64)
+
+    def make_simulator(self, index):
+        """
+        Return a Simulator with the parameters of replica index, for checking
+        the batch against.
+        """
+        host = create_host(
+            self.host_type,
+            None if self.aimd else int(self.window_sizes[index]),
+            self.min_timeout,
+            self.max_timeout,
+            verbose=False,
+        )
+        if self.aimd:
+            host.fast_retransmit = False
+        return Simulator(
+            host,
+            float(self.loss_ratio[index]),
+            int(self.queue_limit[index]),
+            self.rtt_min,
+            int(self.seeds[index]),
+            verbose=False,
+            capacity=self.capacity,
+        )
+
+    def tick(self, tick_val):
+        """
+        Advance every replica by one tick, like Simulator.tick(tick_val).
+        """
+        retx_reps, retx_seqs, retx_counts = self.expire(tick_val)
+        new_reps, new_seqs, new_ranks = self.fill_windows(tick_val)
+        # Retransmissions are sent before new packets, as in the hosts' send()
+        if len(retx_reps):
+            reps = np.concatenate([retx_reps, new_reps])
+            seqs = np.concatenate([retx_seqs, new_seqs])
+            send_ranks = np.concatenate(
+                [ranks(retx_reps), retx_counts[new_reps] + new_ranks]
+            )
+            self.retransmitted += retx_counts
+        else:
+            reps, seqs, send_ranks = new_reps, new_seqs, new_ranks
+        self.sent += np.bincount(reps, minlength=self.replicas)
+        self.enqueue(tick_val, reps, seqs, send_ranks)
+
+        # The packets due at the pdbox now were put in its slot delay ticks ago;
+        # take them out before the link puts this tick's packets in the slot
+        slot = tick_val % self.delay
+        due_seq = self.pdbox_seq[slot].copy()
+        due_sent = self.pdbox_sent[slot].copy()
+        due_valid = self.pdbox_valid[slot].copy()
+        self.dequeue(slot)
+        for position in range(self.capacity):
+            self.deliver(
+                tick_val, due_valid[position], due_seq[position], due_sent[position]
+            )
+
+    def run(self, ticks, start_tick=0):
+        for tick_val in range(start_tick, ticks):
+            self.tick(tick_val)
+
+    def expire(self, tick_val):
+        # Find and reschedule the unacked packets that timed out, in order of
+        # timeout_tick and then seq_num within each replica
+        empty = np.zeros(0, dtype=np.int64)
+        counts = np.zeros(self.replicas, dtype=np.int64)
+        due = np.flatnonzero(self.earliest <= tick_val)
+        if len(due) == 0:
+            return empty, empty, counts
+        timeouts = self.unacked_timeout[due]
+        rows, columns = np.nonzero(timeouts <= tick_val)
+        reps = due[rows]
+        index = reps * self.unacked_capacity + columns
+        seqs = self.unacked_seq.ravel()[index]
+        order = np.lexsort((seqs, timeouts[rows, columns], reps))
+        reps, index, seqs = reps[order], index[order], seqs[order]
+
+        if len(reps):
+            counts = np.bincount(reps, minlength=self.replicas)
+            # The n-th retransmission of a tick is scheduled with the timeout
+            # backed off n times
+            backed_off = self.timeout_calculator.clamp(
+                self.timeout_calculator.timeout[reps] * np.exp2(ranks(reps) + 1)
+            )
+            self.unacked_timeout.ravel()[index] = tick_val + backed_off
+            timeouts[rows[order], columns[order]] = tick_val + backed_off
+            self.timeout_calculator.exp_backoff(reps)
+            retransmitting = np.flatnonzero(counts)
+            if self.aimd:
+                self.decrease(tick_val, retransmitting, counts[retransmitting])
+            self.slow_start[retransmitting] = False
+
+        # every scanned replica now knows its exact earliest timeout
+        self.earliest[due] = timeouts.min(axis=1)
+        return reps, seqs, counts
+
+    def decrease(self, tick_val, reps, counts):
+        # AimdHost checks for a multiplicative decrease after every
+        # retransmission. After a decrease, next_decrease is mean_rtt later, so
+        # further retransmissions of the same tick only decrease again if
+        # mean_rtt is 0.
+        decreasing = self.next_decrease[reps] <= tick_val
+        reps, counts = reps[decreasing], counts[decreasing]
+        mean_rtt = self.timeout_calculator.mean_rtt[reps]
+        halvings = np.where(mean_rtt == 0, counts, 1)
+        self.window[reps] = np.maximum(1.0, self.window[reps] / np.exp2(halvings))
+        self.next_decrease[reps] = tick_val + mean_rtt
+
+    def fill_windows(self, tick_val):
+        # Send new packets until every window is full
+        counts = np.ceil(self.window - self.outstanding).astype(np.int64)
+        np.maximum(counts, 0, out=counts)
+        reps = np.repeat(self.rows, counts)
+        new_ranks = ranks(reps)
+        seqs = self.max_seq[reps] + 1 + new_ranks
+        timeouts = tick_val + self.timeout_calculator.timeout[reps]
+        self.max_seq += counts
+        self.outstanding += counts
+        if len(reps) == 0:
+            return reps, seqs, new_ranks
+
+        index = reps * self.unacked_capacity + seqs % self.unacked_capacity
+        if (
+            counts.max() > self.unacked_capacity
+            or (self.unacked_seq.ravel()[index] >= 0).any()
+        ):
+            self.grow_unacked(reps, seqs)
+            index = reps * self.unacked_capacity + seqs % self.unacked_capacity
+        self.unacked_seq.ravel()[index] = seqs
+        self.unacked_timeout.ravel()[index] = timeouts
+        np.minimum.at(self.earliest, reps, timeouts)
+        return reps, seqs, new_ranks
+
+    def grow_unacked(self, new_reps, new_seqs):
+        # Double the unacked table until the unacked packets and the new ones
+        # all hash to different columns
+        rows, columns = np.nonzero(self.unacked_seq >= 0)
+        seqs = self.unacked_seq[rows, columns]
+        timeouts = self.unacked_timeout[rows, columns]
+        all_rows = np.concatenate([rows, new_reps])
+        all_seqs = np.concatenate([seqs, new_seqs])
+        capacity = self.unacked_capacity
+        while True:
+            capacity *= 2
+            keys = all_rows * capacity + all_seqs % capacity
+            if len(np.unique(keys)) == len(keys):
+                break
+        self.unacked_capacity = capacity
+        self.unacked_seq = np.full((self.replicas, capacity), -1, dtype=np.int64)
+        self.unacked_timeout = np.full((self.replicas, capacity), np.inf)
+        columns = seqs % capacity
+        self.unacked_seq[rows, columns] = seqs
+        self.unacked_timeout[rows, columns] = timeouts
+
+    def enqueue(self, tick_val, reps, seqs, send_ranks):
+        # Link.recv() for every packet sent: a packet is queued if the queue
+        # has room for it after the replica's earlier packets of this tick
+        accepted = self.queue_size[reps] + send_ranks < self.queue_limit[reps]
+        if not accepted.all():
+            self.queue_dropped += np.bincount(reps[~accepted], minlength=self.replicas)
+            reps, seqs, send_ranks = reps[accepted], seqs[accepted], send_ranks[accepted]
+        if len(reps) == 0:
+            return
+        counts = np.bincount(reps, minlength=self.replicas)
+        needed = (self.queue_size + counts).max()
+        if needed > self.queue_capacity:
+            self.grow_queue(next_power_of_two(needed))
+        index = reps * self.queue_capacity + (
+            self.queue_head[reps] + self.queue_size[reps] + send_ranks
+        ) % self.queue_capacity
+        self.queue_seq.ravel()[index] = seqs
+        self.queue_sent.ravel()[index] = tick_val
+        self.queue_size += counts
+
+    def grow_queue(self, capacity):
+        # Unroll every ring into a larger one that starts at column 0
+        offsets = np.arange(self.queue_capacity)
+        columns = (self.queue_head[:, None] + offsets) % self.queue_capacity
+        rows = self.rows[:, None]
+        queue_seq = np.zeros((self.replicas, capacity), dtype=np.int64)
+        queue_sent = np.zeros((self.replicas, capacity), dtype=np.int64)
+        queue_seq[:, : self.queue_capacity] = self.queue_seq[rows, columns]
+        queue_sent[:, : self.queue_capacity] = self.queue_sent[rows, columns]
+        self.queue_seq, self.queue_sent = queue_seq, queue_sent
+        self.queue_head[:] = 0
+        self.queue_capacity = capacity
+
+    def dequeue(self, slot):
+        # Link.tick(): dequeue up to capacity packets per replica, drop the lost
+        # ones and put the rest in the pdbox slot of this tick
+        dequeued = np.minimum(self.queue_size, self.capacity)
+        for position in range(self.capacity):
+            has = dequeued > position
+            index = self.rows * self.queue_capacity + (
+                self.queue_head + position
+            ) % self.queue_capacity
+            kept = has
+            drawing = np.flatnonzero(has & self.lossy)
+            if len(drawing):
+                lost = np.zeros(self.replicas, dtype=bool)
+                lost[drawing] = self.draw(drawing) < self.loss_ratio[drawing]
+                self.link_dropped += lost
+                kept = has & ~lost
+            self.pdbox_seq[slot, position] = self.queue_seq.ravel()[index]
+            self.pdbox_sent[slot, position] = self.queue_sent.ravel()[index]
+            self.pdbox_valid[slot, position] = kept
+        self.queue_head = (self.queue_head + dequeued) % self.queue_capacity
+        self.queue_size -= dequeued
+
+    def draw(self, reps):
+        # Next uniform random number of each replica in reps
+        for rep in reps[self.loss_index[reps] == BLOCK_SIZE]:
+            self.loss_block[rep] = self.rngs[rep].random(BLOCK_SIZE)
+            self.loss_index[rep] = 0
+        values = self.loss_block.ravel()[reps * BLOCK_SIZE + self.loss_index[reps]]
+        self.loss_index[reps] += 1
+        return values
+
+    def deliver(self, tick_val, valid, seqs, sent):
+        # host.recv() for one packet of each replica for which valid is set
+        reps = np.flatnonzero(valid)
+        if len(reps) == 0:
+            return
+        rtt_samples = (tick_val - sent[reps]).astype(float)
+        self.timeout_calculator.apply_samples(reps, rtt_samples)
+        self.delivered += valid
+
+        index = self.rows * self.unacked_capacity + seqs % self.unacked_capacity
+        acked = valid & (self.unacked_seq.ravel()[index] == seqs)
+        acked_index = index[acked]
+        self.unacked_seq.ravel()[acked_index] = -1
+        self.unacked_timeout.ravel()[acked_index] = np.inf
+        self.outstanding -= acked
+
+        if self.aimd:
+            window = self.window
+            increase = np.where(self.slow_start, 1.0, 1 / window)
+            self.window = np.where(valid, window + increase, window)
+
+    @property
+    def in_order_rx_seq(self):
+        # Every packet sent and no longer unacked has been received, so
+        # everything below the lowest unacked sequence number has arrived. This
+        # is what the hosts' ReorderBuffer computes, without a bitmap per replica.
+        lowest = np.where(
+            self.unacked_seq >= 0, self.unacked_seq, np.iinfo(np.int64).max
+        ).min(axis=1)
+        return np.where(self.outstanding > 0, lowest - 1, self.max_seq)
+
+    def results(self):
+        """
+        Return a dict from each name in RESULTS to an array with its value for
+        every replica.
+        """
+        return {
+            "in_order_rx_seq": self.in_order_rx_seq,
+            "max_seq": self.max_seq.copy(),
+            "window": self.window.copy(),
+            "timeout": self.timeout_calculator.timeout.copy(),
+            "mean_rtt": self.timeout_calculator.mean_rtt.copy(),
+            "sent": self.sent.copy(),
+            "retransmitted": self.retransmitted.copy(),
+            "queue_dropped": self.queue_dropped.copy(),
+            "link_dropped": self.link_dropped.copy(),
+            "delivered": self.delivered.copy(),
+        }
+
+
+def check(batch, ticks, indices):
+    """
+    Run replicas indices of batch (already run until ticks) through Simulator
+    and return the indices whose final state differs.
+    """
+    mismatches = []
+    results = batch.results()
+    for index in indices:
+        simulator = batch.make_simulator(index)
+        for tick in range(0, ticks):
+            simulator.tick(tick)
+        host = simulator.host
+        expected = {
+            "in_order_rx_seq": host.in_order_rx_seq,
+            "max_seq": host.max_seq,
+            "window": host.window,
+            "timeout": host.timeout_calculator.timeout,
+            "mean_rtt": host.timeout_calculator.mean_rtt,
+        }
+        if any(results[name][index] != value for name, value in expected.items()):
+            mismatches.append(index)
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run many replicas of the simulator in lockstep"
+    )
+    parser.add_argument("--host_type", dest="host_type", choices=["slidingwindow", "aimd"], required=True)
+    parser.add_argument("--replicas", dest="replicas", type=int, required=True)
+    parser.add_argument("--seed", dest="seed", type=int, default=0, help="Seed of the first replica; replica i uses seed + i")
+    parser.add_argument("--rtt_min", dest="rtt_min", type=int, required=True)
+    parser.add_argument("--ticks", dest="ticks", type=int, required=True)
+    parser.add_argument("--window_size", dest="window_size", type=int, nargs="+", help="Window size, or one per replica")
+    parser.add_argument("--loss_ratio", dest="loss_ratio", type=float, default=0.0)
+    parser.add_argument("--queue_limit", dest="queue_limit", type=int, default=1000000)
+    parser.add_argument("--capacity", dest="capacity", type=int, default=1)
+    parser.add_argument(
+        "--check",
+        dest="check",
+        type=int,
+        default=0,
+        help="Compare the first CHECK replicas against Simulator runs",
+    )
+    args = parser.parse_args()
+
+    window_sizes = args.window_size
+    if window_sizes is not None and len(window_sizes) == 1:
+        window_sizes = window_sizes[0]
+    batch = BatchSimulator(
+        args.host_type,
+        window_sizes,
+        args.loss_ratio,
+        args.queue_limit,
+        args.rtt_min,
+        np.arange(args.seed, args.seed + args.replicas),
+        capacity=args.capacity,
+    )
+    start = time.perf_counter()
+    batch.run(args.ticks)
+    elapsed = time.perf_counter() - start
+    print(
+        "%d replicas x %d ticks in %.2f s (%.0f replica-ticks/s)"
+        % (args.replicas, args.ticks, elapsed, args.replicas * args.ticks / elapsed)
+    )
+    for name, values in batch.results().items():
+        print(
+            "%-16s mean %12.3f std %12.3f min %12.3f max %12.3f"
+            % (name, values.mean(), values.std(), values.min(), values.max())
+        )
+    if args.check:
+        mismatches = check(batch, args.ticks, range(min(args.check, args.replicas)))
+        if mismatches:
+            print("Replicas differing from Simulator: %s" % mismatches)
+        else:
+            print("First %d replicas match Simulator" % min(args.check, args.replicas))
@@ -0,0 +1,125 @@
+import numpy as np
+
+from timeout_calculator import TimeoutCalculator
+
+
+class BatchTimeoutCalculator:
+    """
+    Vectorized TimeoutCalculator for num_flows independent flows. Every data member
+    of TimeoutCalculator that is per-flow state is an array with one entry per flow:
+
+    **mean_rtt**: Mean RTT of each flow
+
+    **rtt_var**: RTT variance of each flow
+
+    **timeout**: Current timeout of each flow
+
+    **ewma_init**: Whether the EWMA of each flow has been initialized
+
+    alpha, beta, k, min_timeout and max_timeout are shared by all flows. The
+    update equations are evaluated in the same order as in TimeoutCalculator, so
+    the results are bit-for-bit identical to running one TimeoutCalculator per flow.
+    """
+
+    def __init__(
+        self,
+        num_flows,
+        min_timeout=TimeoutCalculator.MIN_TIMEOUT,
+        max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+    ):
+        self.num_flows = num_flows
+        # minimum possible timeout
+        self.min_timeout = min_timeout
+        # maximum possible timeout
+        self.max_timeout = max_timeout
+        self.mean_rtt = np.zeros(num_flows)
+        self.rtt_var = np.zeros(num_flows)
+        # same constants as TimeoutCalculator
+        self.alpha = 0.125
+        self.beta = 0.25
+        self.k = 4.0
+        # Initialize timeout to the minimum possible value
+        self.timeout = np.full(num_flows, float(min_timeout))
+        # EWMA is not initialized until the first sample is seen
+        self.ewma_init = np.zeros(num_flows, dtype=bool)
+
+    def update_timeout(self, flows, rtt_samples):
+        """
+        Apply rtt_samples[i] to flow flows[i], for all i, as if
+        update_timeout(rtt_samples[i]) had been called on that flow's
+        TimeoutCalculator. A flow may appear more than once, in which case its
+        samples are applied in the order given.
+
+        Returns:
+
+            The updated timeouts of flows
+        """
+        flows = np.asarray(flows, dtype=np.intp).reshape(-1)
+        rtt_samples = np.asarray(rtt_samples, dtype=float).reshape(-1)
+        assert len(flows) == len(rtt_samples)
+        for batch in occurrence_batches(flows):
+            self.apply_samples(flows[batch], rtt_samples[batch])
+        return self.timeout[flows]
+
+    def apply_samples(self, flows, rtt_samples):
+        # flows has no duplicates here
+        init = self.ewma_init[flows]
+        mean_rtt = self.mean_rtt[flows]
+        rtt_var = self.rtt_var[flows]
+
+        # Flows that have seen no RTTs yet or exponentially backed off before
+        new_var = np.where(
+            init,
+            (1 - self.beta) * rtt_var + self.beta * np.abs(rtt_samples - mean_rtt),
+            rtt_samples / 2,
+        )
+        new_mean = np.where(
+            init, (1 - self.alpha) * mean_rtt + self.alpha * rtt_samples, rtt_samples
+        )
+        self.rtt_var[flows] = new_var
+        self.mean_rtt[flows] = new_mean
+        self.timeout[flows] = self.clamp(new_mean + (self.k * new_var))
+        self.ewma_init[flows] = True
+
+    def exp_backoff(self, flows):
+        """
+        Double the timeout of each flow in flows, as exp_backoff() does for one
+        flow, and re-initialize its EWMA. A flow that appears n times is backed
+        off n times.
+
+        Returns:
+
+            The updated timeouts of flows
+        """
+        flows = np.asarray(flows, dtype=np.intp).reshape(-1)
+        counts = np.bincount(flows, minlength=self.num_flows)
+        backed_off = counts > 0
+        # Doubling is exact and clamping is monotone, so n rounds of
+        # "double, then clamp" are the same as one "multiply by 2^n, then clamp"
+        self.timeout[backed_off] = self.clamp(
+            self.timeout[backed_off] * np.exp2(counts[backed_off])
+        )
+        self.ewma_init[backed_off] = False
+        return self.timeout[flows]
+
+    def clamp(self, timeout):
+        # ensure that timeout is between self.min_timeout and self.max_timeout
+        timeout = np.where(timeout > self.max_timeout, self.max_timeout, timeout)
+        return np.where(timeout < self.min_timeout, self.min_timeout, timeout)
+
+
+def occurrence_batches(flows):
+    """
+    Split the positions of flows into batches with no repeated flow: the first
+    batch holds the first occurrence of every flow, the second batch the second
+    occurrence, and so on. Returns a list of index arrays.
+    """
+    if len(flows) == 0:
+        return []
+    order = np.argsort(flows, kind="stable")
+    sorted_flows = flows[order]
+    # position of each element within its run of equal flows
+    starts = np.flatnonzero(np.r_[True, sorted_flows[1:] != sorted_flows[:-1]])
+    run_lengths = np.diff(np.r_[starts, len(flows)])
+    rank = np.arange(len(flows)) - np.repeat(starts, run_lengths)
+    return [np.sort(order[rank == r]) for r in range(rank.max() + 1)]
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmarks for the simulator core.
+
+Each benchmark case runs one host type on one network configuration and
+measures simulated ticks per second of wall time and peak memory allocated by
+Python (via tracemalloc, in a separate run so that tracing does not slow down
+the timed one). Results are written as JSON, and can be compared against a
+saved baseline to catch performance regressions:
+
+    python3 benchmark.py --output baseline.json
+    ... change the code ...
+    python3 benchmark.py --baseline baseline.json
+
+The comparison exits with status 1 if any case got slower, or used more memory,
+than the baseline by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from congestion_collapse import return_congested_simulator
+from hosts import create_host
+from simulator import Simulator
+from timeout_calculator import TimeoutCalculator
+
+# (name, host_type, window_size, rtt_min, loss_ratio, queue_limit, ticks)
+CASES = [
+    ("stopandwait_rtt10", "stopandwait", None, 10, 0.0, 1000000, 200000),
+    ("stopandwait_rtt1000_loss", "stopandwait", None, 1000, 0.01, 1000000, 200000),
+    ("slidingwindow_w10_rtt10", "slidingwindow", 10, 10, 0.0, 1000000, 100000),
+    ("slidingwindow_w100_rtt100_loss", "slidingwindow", 100, 100, 0.01, 1000000, 100000),
+    ("slidingwindow_w10000_rtt1000", "slidingwindow", 10000, 1000, 0.0, 1000000, 50000),
+    ("slidingwindow_w1000_rtt100_q50", "slidingwindow", 1000, 100, 0.0, 50, 50000),
+    ("aimd_rtt10", "aimd", None, 10, 0.0, 1000000, 100000),
+    ("aimd_rtt100_loss_q100", "aimd", None, 100, 0.01, 100, 100000),
+    ("aimd_rtt1000_loss", "aimd", None, 1000, 0.001, 1000000, 100000),
+]
+
+# window sizes for the congestion collapse configuration, see congestion_collapse.py
+COLLAPSE_WINDOWS = [10, 100, 1000]
+COLLAPSE_TICKS = 10000
+
+
+def make_simulators():
+    """
+    Return a list of (name, ticks, factory) where factory() builds a fresh
+    Simulator for the case.
+    """
+    simulators = []
+    for name, host_type, window_size, rtt_min, loss_ratio, queue_limit, ticks in CASES:
+
+        def factory(
+            host_type=host_type,
+            window_size=window_size,
+            rtt_min=rtt_min,
+            loss_ratio=loss_ratio,
+            queue_limit=queue_limit,
+        ):
+            host = create_host(
+                host_type,
+                window_size,
+                TimeoutCalculator.MIN_TIMEOUT,
+                TimeoutCalculator.MAX_TIMEOUT,
+                verbose=False,
+            )
+            return Simulator(host, loss_ratio, queue_limit, rtt_min, 1, verbose=False)
+
+        simulators.append((name, ticks, factory))
+    for window_size in COLLAPSE_WINDOWS:
+
+        def factory(window_size=window_size):
+            host = create_host(
+                "slidingwindow",
+                window_size,
+                TimeoutCalculator.MIN_TIMEOUT,
+                TimeoutCalculator.MAX_TIMEOUT,
+                verbose=False,
+            )
+            return return_congested_simulator(host)
+
+        simulators.append(
+            ("congestion_collapse_w%d" % window_size, COLLAPSE_TICKS, factory)
+        )
+    return simulators
+
+
+def run_case(factory, ticks, event_driven):
+    simulator = factory()
+    if event_driven:
+        simulator.run(ticks)
+    else:
+        for tick in range(0, ticks):
+            simulator.tick(tick)
+
+
+def benchmark(names=None, event_driven=False, repeat=1):
+    """
+    Run the benchmark cases (all of them, or those in names) and return a dict
+    from case name to its measurements.
+    """
+    results = {}
+    for name, ticks, factory in make_simulators():
+        if names and name not in names:
+            continue
+        # best of repeat runs, to reduce noise
+        elapsed = min(
+            timed(lambda: run_case(factory, ticks, event_driven))
+            for _ in range(repeat)
+        )
+        tracemalloc.start()
+        run_case(factory, ticks, event_driven)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {
+            "ticks": ticks,
+            "seconds": elapsed,
+            "ticks_per_second": ticks / elapsed,
+            "peak_memory_bytes": peak,
+        }
+        print(
+            "%-34s %12.0f ticks/s %10.1f KiB peak"
+            % (name, ticks / elapsed, peak / 1024.0),
+            file=sys.stderr,
+        )
+    return results
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results against baseline results and return a list of regression
+    messages, empty if there are none.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        if result["ticks_per_second"] < old["ticks_per_second"] * (1 - tolerance):
+            regressions.append(
+                "%s: %.0f ticks/s, baseline %.0f ticks/s"
+                % (name, result["ticks_per_second"], old["ticks_per_second"])
+            )
+        if result["peak_memory_bytes"] > old["peak_memory_bytes"] * (1 + tolerance):
+            regressions.append(
+                "%s: peak memory %d bytes, baseline %d bytes"
+                % (name, result["peak_memory_bytes"], old["peak_memory_bytes"])
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the simulator core")
+    parser.add_argument(
+        "--output",
+        dest="output",
+        default="benchmark_results.json",
+        help="JSON file to write the results to",
+    )
+    parser.add_argument(
+        "--baseline", dest="baseline", help="JSON results to compare against"
+    )
+    parser.add_argument(
+        "--tolerance",
+        dest="tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative slowdown or memory growth, default 0.2",
+    )
+    parser.add_argument(
+        "--cases", dest="cases", nargs="+", help="Only run these cases"
+    )
+    parser.add_argument(
+        "--repeat", dest="repeat", type=int, default=3, help="Timed runs per case"
+    )
+    parser.add_argument(
+        "--event_driven",
+        dest="event_driven",
+        action="store_true",
+        help="Use Simulator.run instead of stepping every tick",
+    )
+    args = parser.parse_args()
+
+    # Read the baseline first, so that it can never be the run it is compared to
+    baseline = None
+    if args.baseline is not None:
+        if os.path.abspath(args.baseline) == os.path.abspath(args.output):
+            parser.error("--output must not be the same file as --baseline")
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = benchmark(args.cases, args.event_driven, args.repeat)
+    with open(args.output, "w") as output_file:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "event_driven": args.event_driven,
+                "results": results,
+            },
+            output_file,
+            indent=2,
+        )
+    if baseline is not None:
+        if baseline.get("event_driven") != args.event_driven:
+            print("Warning: baseline was run with a different --event_driven setting")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against " + args.baseline)
@@ -0,0 +1,138 @@
+"""
+Checkpointing of Simulator runs.
+
+A checkpoint captures everything a run depends on: the Simulator object with its
+host (including the TimeoutCalculator and unacked packets), link queue and pdbox
+(including their random number streams) and the tick to continue from. It is a
+zlib-compressed pickle. Resuming from a
+checkpoint continues the run exactly as if it had never been interrupted.
+
+Recorders and profilers are not part of a checkpoint: attach new ones after
+resuming if needed. Tracers keep their buffered events but not their trace file.
+
+Checkpoints also allow warm starts: simulate the warm-up once, checkpoint the
+steady state, and fork many variants (different loss ratio, queue limit, window
+size or seed) from it with run_variants(), instead of re-simulating the same
+warm-up ticks for every variant.
+"""
+
+import concurrent.futures
+import os
+import pickle
+import zlib
+
+import numpy as np
+
+from loss_models import BernoulliLoss
+
+
+def dumps(simulator, tick):
+    """
+    Return a checkpoint of simulator, which is to continue at tick, as bytes.
+    """
+    # Detach the recorder, which holds memory-mapped files, while pickling
+    recorder = simulator.recorder
+    rtt_observer = getattr(simulator.host, "rtt_observer", None)
+    profiler = simulator.profiler
+    simulator.recorder = None
+    simulator.profiler = None
+    if recorder is not None:
+        simulator.host.rtt_observer = None
+    try:
+        state = {"simulator": simulator, "tick": tick}
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        simulator.recorder = recorder
+        simulator.profiler = profiler
+        if recorder is not None:
+            simulator.host.rtt_observer = rtt_observer
+    return zlib.compress(data)
+
+
+def loads(data):
+    """
+    Restore a checkpoint made by dumps(). Returns (simulator, tick), where tick
+    is the next tick to simulate.
+    """
+    state = pickle.loads(zlib.decompress(data))
+    return state["simulator"], state["tick"]
+
+
+def save(simulator, tick, path):
+    """
+    Write a checkpoint of simulator, which is to continue at tick, to path.
+    """
+    data = dumps(simulator, tick)
+    with open(path, "wb") as checkpoint_file:
+        checkpoint_file.write(data)
+
+
+def load(path):
+    """
+    Read a checkpoint written by save(). Returns (simulator, tick) like loads().
+    """
+    with open(path, "rb") as checkpoint_file:
+        return loads(checkpoint_file.read())
+
+
+def apply_variant(simulator, variant):
+    """
+    Change the parameters of a simulator restored from a checkpoint. variant is
+    a dict that may set loss_ratio, queue_limit, window_size (for hosts with a
+    window) and seed (to reseed the link's and the pdbox's random number streams
+    so variants diverge). The new window_size must be at least the number of
+    packets currently unacked, and loss_ratio can only be changed for Bernoulli
+    losses.
+    """
+    for name, value in variant.items():
+        if name == "loss_ratio":
+            if not isinstance(simulator.link.loss_model, BernoulliLoss):
+                raise ValueError("loss_ratio can only be changed for Bernoulli losses")
+            simulator.link.loss_model.loss_ratio = value
+        elif name == "queue_limit":
+            simulator.link.queue_limit = value
+            simulator.link.link_queue.limit = value
+        elif name == "window_size":
+            if len(simulator.host.unacked) > value:
+                raise ValueError(
+                    "window_size is smaller than the number of unacked packets"
+                )
+            simulator.host.window = value
+        elif name == "seed":
+            link_seed, pdbox_seed = np.random.SeedSequence(value).spawn(2)
+            simulator.link.loss_model.reseed(link_seed)
+            simulator.pdbox.reseed(pdbox_seed)
+        else:
+            raise ValueError("Unknown variant parameter " + name)
+
+
+def run_variant(data, variant, ticks):
+    """
+    Fork one variant from checkpoint data and run it until ticks. Returns the
+    variant with the resulting in_order_rx_seq filled in (a list with one entry
+    per flow for a MultiFlowHost).
+    """
+    simulator, tick = loads(data)
+    apply_variant(simulator, variant)
+    simulator.run(ticks, start_tick=tick)
+    result = dict(variant)
+    if hasattr(simulator.host, "hosts"):
+        result["in_order_rx_seq"] = [host.in_order_rx_seq for host in simulator.host.hosts]
+    else:
+        result["in_order_rx_seq"] = simulator.host.in_order_rx_seq
+    return result
+
+
+def run_variants(data, variants, ticks, workers=None):
+    """
+    Fork every variant in variants from checkpoint data, run them until ticks on
+    a pool of worker processes (one per CPU by default, in-process if workers
+    is 1) and return their results in the order of variants.
+    """
+    if workers == 1:
+        return [run_variant(data, variant, ticks) for variant in variants]
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count()
+    ) as pool:
+        futures = [pool.submit(run_variant, data, variant, ticks) for variant in variants]
+        return [future.result() for future in futures]
@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
+import argparse
+
+from result_cache import ResultCache
 from simulator import Simulator
 from sliding_window_host import SlidingWindowHost
+from sweep import make_grid, run_sweep
 # from starter_code.timeout_calculator import TimeoutCalculator
 from timeout_calculator import TimeoutCalculator
 
+# Settings of the congestion collapse runs, shared by
+# return_congested_simulator and the sweep in main
+LOSS_RATIO = 0.0
+QUEUE_LIMIT = 1000000
+RTT_MIN = 10
+SEED = 1000
+TICKS = 10000
+
+
 def return_congested_simulator(host):
     # TODO: Create simulator that shows a congestion collapse setting.
     #what should be rtt min?
-    simulator = Simulator(host, 0.0, 1000000, 10 ,1000)
+    simulator = Simulator(host, LOSS_RATIO, QUEUE_LIMIT, RTT_MIN, SEED)
 
     # Use  0.0 for loss_ratio, 1000 for the seed, and 1000000 for queue_limit.
     return simulator
@@ -16,7 +29,7 @@ def return_congested_simulator(host):
 def tick_and_get_seq_number(window):
     host = SlidingWindowHost(window, verbose=False)
     simulator = return_congested_simulator(host)
-    for tick in range(0, 10000):
+    for tick in range(0, TICKS):
         simulator.tick(tick)
     # Return the largest sequence number that has been received in order
     print(
@@ -27,40 +40,42 @@ def tick_and_get_seq_number(window):
 
 
 def get_window_sizes():
-    window_sizes = []
+    window_sizes = [2, 5, 10, 20, 30, 50, 80, 100, 300, 500, 600, 1000]
     return window_sizes
 
 
-def main():
+def main(use_cache=True):
     # TODO: Select a progression of window sizes, which show a congestion collapse curve.
 
     #what does he mean by that?
 
-    window_sizes = get_window_sizes(2, 5, 10, 20, 30, 50, 80, 100, 300, 500, 600 , 1000)    # Should have at least 10 entries.
+    window_sizes = get_window_sizes()    # Should have at least 10 entries.
     assert len(window_sizes) >= 10
     # Windows should be strictly increasing
 
     assert all(x <= y for x, y in zip(window_sizes, window_sizes[1:]))
     # TODO: For each window size, call tick_and_get_seq_number
-    res = []
-    for x in window_sizes:
-        ordernum = tick_and_get_seq_number(x)
-        res.append(ordernum)
-        
-        
-
-
-
+    # The window sizes are independent runs, so run them in parallel with the
+    # collapse settings above, like return_congested_simulator
+    # Window sizes simulated before with the same code come from the result cache
+    grid = make_grid(
+        window_sizes, [SEED], [RTT_MIN], [LOSS_RATIO], [QUEUE_LIMIT], TICKS
+    )
+    cache = ResultCache() if use_cache else None
+    results = run_sweep(grid, cache=cache)
 
     # TODO: Collect the results
-    seq_numbers = []
-
-
+    seq_numbers = [result["in_order_rx_seq"] for result in results]
+    for window, seq_number in zip(window_sizes, seq_numbers):
+        print("Window %s: maximum in order received sequence number %s" % (window, seq_number))
 
     # Optional" Plot the results
-    
-    
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Congestion collapse curve")
+    parser.add_argument(
+        "--no_cache", action="store_true", help="simulate every window size, bypassing the result cache"
+    )
+    args = parser.parse_args()
+    main(use_cache=not args.no_cache)
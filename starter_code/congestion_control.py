@@ -0,0 +1,240 @@
+"""
+Congestion controllers for AimdHost.
+
+A congestion controller owns the congestion window of a host and decides how it
+grows on every ACK and shrinks on every congestion event, while the host keeps
+the machinery that is common to all of them: unacked packets, retransmission
+timers, fast retransmit and pacing. A host calls
+
+    controller.on_ack(tick, rtt_sample, mean_rtt)
+
+for every packet it receives, with the packet's RTT sample and the smoothed RTT
+of its TimeoutCalculator (already updated with the sample), and
+
+    controller.on_loss(tick, mean_rtt)
+
+for every packet that times out or is detected as lost by fast retransmit. A
+congestion event leaves slow start and decreases the window at most once per
+RTT (the next_decrease hysteresis), however many packets it lost.
+
+**Reno**: Slow start by one packet per ACK, then additive increase by one
+packet per RTT and halving on loss; AimdHost's original window logic
+
+**Cubic**: CUBIC (RFC 9438). After a loss the window grows along a cubic
+function of the time since the loss, which plateaus around the window at
+which the loss happened and then probes beyond it. The growth depends on
+time rather than on ACKs, so it does not slow down with the RTT like Reno's,
+and recovers a large window in a few RTTs
+
+**Vegas**: Delay-based, like TCP Vegas. Once per RTT it estimates how many of
+its packets are sitting in the link's queue, from how far the RTT is above
+the smallest RTT seen, and keeps that between ALPHA and BETA packets. The
+window settles at about the bandwidth-delay product plus a few packets, so
+the queue stays short without any losses. Loss-based flows sharing the link
+fill up the queue it keeps short, so it gets less than its share against them
+"""
+
+import math
+
+
+class CongestionController:
+    """
+    Base class of congestion controllers. Subclasses implement on_ack() and
+    decrease(). Data members of this class are
+
+    **window**: Congestion window in packets (may be fractional)
+
+    **slow_start**: Whether the controller is still in slow start, which ends
+    with the first congestion event at the latest
+
+    **next_decrease**: Time (in ticks) before which congestion events do not
+    decrease the window again
+    """
+
+    def __init__(self):
+        self.window = 1
+        self.slow_start = True
+        self.next_decrease = -1
+
+    def on_ack(self, tick, rtt_sample, mean_rtt):
+        raise NotImplementedError
+
+    def on_loss(self, tick, mean_rtt):
+        """
+        Handle a congestion event: leave slow start and decrease the window,
+        unless the last decrease was less than an RTT (mean_rtt) ago.
+        """
+        if tick >= self.next_decrease:
+            self.decrease(tick)
+            self.next_decrease = tick + mean_rtt
+        self.slow_start = False
+
+    def decrease(self, tick):
+        raise NotImplementedError
+
+
+class Reno(CongestionController):
+    """
+    Additive increase, multiplicative decrease (TCP Reno without its ssthresh).
+    """
+
+    def on_ack(self, tick, rtt_sample, mean_rtt):
+        if self.slow_start:
+            self.window += 1
+        else:
+            self.window += 1 / self.window
+
+    def decrease(self, tick):
+        # Cut window by half, but don't let it go below 1
+        self.window /= 2
+        if self.window < 1:
+            self.window = 1
+
+
+class Cubic(CongestionController):
+    """
+    CUBIC window growth (RFC 9438). Additional data members of this class are
+
+    **w_max**: Window at the last congestion event (reduced by fast
+    convergence if it was below the previous one)
+
+    **k**: Time in ticks after the last congestion event at which the cubic
+    function gets back to w_max
+
+    **epoch_start**: Tick of the last congestion event, or None before the
+    first one
+
+    **w_est**: Window that Reno would have reached since epoch_start with the
+    same average throughput; CUBIC never grows slower than that
+    """
+
+    # Multiplicative decrease factor
+    BETA = 0.7
+    # Scaling constant of the cubic function, in packets per tick^3. This is
+    # RFC 9438's 0.4 packets/s^3, taking a tick to be a millisecond.
+    C = 0.4e-9
+    # Additive increase per RTT of the Reno-friendly estimate, chosen so that
+    # its average throughput matches Reno's with BETA instead of 1/2
+    ALPHA = 3 * (1 - BETA) / (1 + BETA)
+
+    def __init__(self):
+        super().__init__()
+        self.w_max = 0.0
+        self.k = 0.0
+        self.epoch_start = None
+        self.w_est = 0.0
+
+    def on_ack(self, tick, rtt_sample, mean_rtt):
+        if self.slow_start:
+            self.window += 1
+            return
+        if self.epoch_start is None:
+            self.start_epoch(tick)
+        t = tick - self.epoch_start
+        self.w_est += self.ALPHA / self.window
+        if self.cubic(t) < self.w_est:
+            # Reno-friendly region
+            self.window = self.w_est
+            return
+        # Grow towards where the cubic function will be one RTT from now, by
+        # at most half the window per RTT
+        target = min(max(self.cubic(t + mean_rtt), self.window), 1.5 * self.window)
+        self.window += (target - self.window) / self.window
+
+    def decrease(self, tick):
+        if self.window < self.w_max:
+            # Fast convergence: release bandwidth to newer flows
+            self.w_max = self.window * (1 + self.BETA) / 2
+        else:
+            self.w_max = self.window
+        self.window = max(1, self.window * self.BETA)
+        self.start_epoch(tick)
+
+    def start_epoch(self, tick):
+        # Start a new cubic curve at tick from the current window
+        if self.w_max < self.window:
+            self.w_max = self.window
+        self.epoch_start = tick
+        self.k = ((self.w_max - self.window) / self.C) ** (1 / 3)
+        self.w_est = self.window
+
+    def cubic(self, t):
+        # The cubic function, t ticks after epoch_start
+        return self.C * (t - self.k) ** 3 + self.w_max
+
+
+class Vegas(Reno):
+    """
+    Delay-based congestion avoidance in the style of TCP Vegas; losses halve the
+    window like Reno. Additional data members of this class are
+
+    **base_rtt**: Smallest RTT sample seen, the RTT without queueing
+
+    **round_min_rtt**: Smallest RTT sample of the current round (RTT)
+
+    **round_window**: Window at the start of the current round
+
+    **previous_window**: Window at the start of the round before
+
+    **round_start**: Tick at which the current round started. It ends with the
+    first ACK of a packet sent since then, i.e., about an RTT later
+
+    **growing**: Whether the window grows in the current round of slow start
+
+    The ACKs of a round are those of the packets sent in the round before, so
+    at the end of every round, the window of the round before and the smallest
+    RTT sample give how many packets were queued. In congestion avoidance the
+    window then grows or shrinks by one packet. Slow start only doubles the
+    window every other round, as its bursts queue up packets by themselves:
+    the round after a doubling sends at a steady window, and slow start ends
+    as soon as that round queues more than GAMMA packets.
+    """
+
+    # Packets in the queue below which the window grows by one per RTT
+    ALPHA = 2
+    # Packets in the queue above which the window shrinks by one per RTT
+    BETA = 4
+    # Packets in the queue above which slow start ends
+    GAMMA = 1
+
+    def __init__(self):
+        super().__init__()
+        self.base_rtt = math.inf
+        self.round_min_rtt = math.inf
+        self.round_window = self.window
+        self.previous_window = self.window
+        self.round_start = 0
+        self.growing = False
+
+    def on_ack(self, tick, rtt_sample, mean_rtt):
+        if rtt_sample < self.base_rtt:
+            self.base_rtt = rtt_sample
+        if tick - rtt_sample >= self.round_start:
+            self.end_round(tick)
+        if rtt_sample < self.round_min_rtt:
+            self.round_min_rtt = rtt_sample
+        if self.slow_start and self.growing:
+            self.window += 1
+
+    def end_round(self, tick):
+        # Adjust the window to the packets queued in the round ending at tick,
+        # then start the next round
+        if self.round_min_rtt < math.inf:
+            # the window sent previous_window / round_min_rtt packets per tick,
+            # but only previous_window / base_rtt got through without
+            # queueing, and the difference over an RTT waited in the queue
+            queued = self.previous_window * (1 - self.base_rtt / self.round_min_rtt)
+            if self.slow_start:
+                if self.growing and queued > self.GAMMA:
+                    # Drop back to what the path carries without queueing
+                    self.slow_start = False
+                    self.window = max(2, self.previous_window - queued)
+            elif queued < self.ALPHA:
+                self.window += 1
+            elif queued > self.BETA:
+                self.window = max(2, self.window - 1)
+        self.growing = self.slow_start and not self.growing
+        self.previous_window = self.round_window
+        self.round_window = self.window
+        self.round_min_rtt = math.inf
+        self.round_start = tick
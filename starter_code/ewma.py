@@ -1,30 +1,38 @@
+import collections.abc
+import itertools
 import sys
-import matplotlib.pyplot as plt
 
+import numpy as np
 
-class Ewma:
-    def __init__(self, alpha):
+# number of rtt samples
+NUM_SAMPLES = 100
 
-        # number of rtt samples
-        NUM_SAMPLES = 100
 
-        # initialize all of them to zero
-        rtt_samples = [0.0] * NUM_SAMPLES
+def make_rtt_samples():
+    # initialize all of them to zero
+    rtt_samples = [0.0] * NUM_SAMPLES
+
+    # Create a pattern where the first half of the samples are 1
+    for i in range(0, int(NUM_SAMPLES * 0.7)):
+        rtt_samples[i] = 1.0
+
+    # And the next half are 2
+    for i in range(int(NUM_SAMPLES * 0.7), int(NUM_SAMPLES * 0.8)):
+        rtt_samples[i] = 2.0
+
+    # And the next half are 1
+    for i in range(int(NUM_SAMPLES * 0.8), NUM_SAMPLES):
+        rtt_samples[i] = 1.0
+    return rtt_samples
 
-        # rtt after being smoothed by EWMA
-        self.smooth_rtt = [0.0] * NUM_SAMPLES
 
-        # Create a pattern where the first half of the samples are 1
-        for i in range(0, int(NUM_SAMPLES * 0.7)):
-            rtt_samples[i] = 1.0
+class Ewma:
+    def __init__(self, alpha):
 
-        # And the next half are 2
-        for i in range(int(NUM_SAMPLES * 0.7), int(NUM_SAMPLES * 0.8)):
-            rtt_samples[i] = 2.0
+        rtt_samples = make_rtt_samples()
 
-        # And the next half are 1
-        for i in range(int(NUM_SAMPLES * 0.8), NUM_SAMPLES):
-            rtt_samples[i] = 1.0
+        # rtt after being smoothed by EWMA
+        self.smooth_rtt = [0.0] * NUM_SAMPLES
 
         # initialize mean rtt to 1
         mean_rtt = 1
@@ -41,12 +49,113 @@ class Ewma:
             self.smooth_rtt[i] = mean_rtt
 
     def plot(self):
-        # plot the distribution
+        # plot the distribution; matplotlib is only imported when plotting
+        import matplotlib.pyplot as plt
+
         plt.plot(self.smooth_rtt)
         plt.ylim([0, 2.5])
         plt.show()
 
 
+class EwmaEngine:
+    """
+    Smooths a stream of RTT samples with many values of alpha at once.
+
+    For a block of b samples x_0 .. x_{b-1} and decay d = 1 - alpha, the EWMA
+    recurrence mean_i = d * mean_{i-1} + alpha * x_i unrolls to
+
+        mean_i = d^(i+1) * mean_{-1} + sum_{j <= i} alpha * d^(i-j) * x_j
+
+    so a whole block is one batched matrix-vector product with a lower-triangular
+    weight matrix per alpha, computed once up front. Only non-negative powers of
+    d are used, so this is numerically stable for every alpha in [0, 1]. The
+    last mean of each block is carried over to the next one, which lets samples
+    be fed in chunks of any size, e.g., from a log that does not fit in memory.
+
+    Data members of this class are
+
+    **alphas**: Array of the alphas being compared
+
+    **mean_rtt**: Array with the current mean RTT for each alpha, or None
+    before the first sample if no initial value was given
+    """
+
+    def __init__(self, alphas, initial=None, block_size=128):
+        self.alphas = np.asarray(alphas, dtype=float).reshape(-1)
+        if initial is None:
+            # initialized from the first sample, like TimeoutCalculator
+            self.mean_rtt = None
+        else:
+            self.mean_rtt = np.full(len(self.alphas), float(initial))
+        self.block_size = block_size
+        decay = 1.0 - self.alphas[:, None]
+        steps = np.arange(block_size)
+        # lag[i, j] = i - j, the age of sample j when computing mean i
+        lag = steps[:, None] - steps[None, :]
+        # weights[a, i, j] = alpha * d^(i-j) for j <= i, 0 otherwise
+        self.weights = np.where(
+            lag >= 0,
+            self.alphas[:, None, None] * decay[:, :, None] ** np.maximum(lag, 0),
+            0.0,
+        )
+        # carry[a, i] = d^(i+1), the weight of the mean before the block
+        self.carry = decay ** (steps + 1)
+
+    def update(self, samples):
+        """
+        Feed the next chunk of samples and return their smoothed values, as an
+        array with one row per alpha and one column per sample.
+        """
+        samples = np.asarray(samples, dtype=float).reshape(-1)
+        out = np.empty((len(self.alphas), len(samples)))
+        if len(samples) == 0:
+            return out
+        if self.mean_rtt is None:
+            self.mean_rtt = np.full(len(self.alphas), samples[0])
+        for start in range(0, len(samples), self.block_size):
+            block = samples[start : start + self.block_size]
+            b = len(block)
+            smoothed = self.weights[:, :b, :b] @ block
+            smoothed += self.carry[:, :b] * self.mean_rtt[:, None]
+            out[:, start : start + b] = smoothed
+            self.mean_rtt = smoothed[:, -1].copy()
+        return out
+
+    def smooth(self, samples):
+        """
+        Smooth samples, which can be an array or a list of samples, or an
+        iterator (e.g., a generator) of chunks of samples. Returns one row per alpha.
+        """
+        if not isinstance(samples, collections.abc.Iterator):
+            return self.update(samples)
+        return np.concatenate(
+            [self.update(chunk) for chunk in samples]
+            + [np.empty((len(self.alphas), 0))],
+            axis=1,
+        )
+
+    def iter_smooth(self, chunks):
+        """
+        Generator version of smooth for input that does not fit in memory:
+        yields the smoothed values of each chunk as soon as it is processed.
+        """
+        for chunk in chunks:
+            yield self.update(chunk)
+
+
+def iter_rtt_log(path, chunk_size=65536):
+    """
+    Read a text file with one RTT sample per line and yield it in chunks of
+    chunk_size samples, without loading the whole file.
+    """
+    with open(path) as log:
+        while True:
+            lines = list(itertools.islice(log, chunk_size))
+            if len(lines) == 0:
+                return
+            yield np.array([float(line) for line in lines if line.strip()])
+
+
 def main(alpha):
     # If we use an argument, plot the argument only
     if alpha is not None:
@@ -58,24 +167,15 @@ def main(alpha):
         ewma.plot()
         return
     # get alpha from the command line
-    ewma1 = Ewma(1)
-    ewma2 = Ewma(0.1)
-    ewma3 = Ewma(0.05)
-    ewma4 = Ewma(0.01)
-    # ewma1.plot()
-    # ewma2.plot()
-    # ewma3.plot()
-    # ewma4.plot()
+    # Compare several alphas in one batched pass over the samples
+    alphas = [1, 0.1, 0.05, 0.01]
+    smooth_rtt = EwmaEngine(alphas, initial=1).smooth(make_rtt_samples())
     print("EWMA at step 75")
-    print("Alpha 1: RTT %s" % ewma1.smooth_rtt[75])
-    print("Alpha 0.1: RTT %s" % ewma2.smooth_rtt[75])
-    print("Alpha 0.05: RTT %s" % ewma3.smooth_rtt[75])
-    print("Alpha 0.01: RTT %s" % ewma4.smooth_rtt[75])
+    for alpha, row in zip(alphas, smooth_rtt):
+        print("Alpha %s: RTT %s" % (alpha, row[75]))
     print("EWMA at step 90")
-    print("Alpha 1: RTT %s" % ewma1.smooth_rtt[90])
-    print("Alpha 0.1: RTT %s" % ewma2.smooth_rtt[90])
-    print("Alpha 0.05: RTT %s" % ewma3.smooth_rtt[90])
-    print("Alpha 0.01: RTT %s" % ewma4.smooth_rtt[90])
+    for alpha, row in zip(alphas, smooth_rtt):
+        print("Alpha %s: RTT %s" % (alpha, row[90]))
 
 
 if __name__ == "__main__":
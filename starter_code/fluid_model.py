@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Fluid model of SlidingWindowHost and AimdHost, for quick steady-state
+estimates without a packet-level simulation.
+
+The fluid model treats packets as a continuous flow. The link serves capacity
+packets per tick and has a queue of up to queue_limit packets. The RTT is
+rtt_min plus the queueing delay queue / capacity. (The simulator's RTT samples
+are one tick shorter, because an ACK arrives after the host has sent on that
+tick. Estimated RTTs are reported the same way.)
+
+**SlidingWindowHost**: The window is fixed, so the steady state has a closed
+form. A packet holds a window slot for one RTT if it is ACKed. If it is lost,
+it holds the slot for a retransmission timeout (RTO). The window is therefore
+window = rate * ((1 - loss) * RTT + loss * RTO) (Little's law). The queue grows
+until the send rate reaches the link capacity. Past queue_limit, the excess is
+dropped at the queue. The closed form leaves out what the drops set off: the
+queue overflows in bursts, and the dropped packets time out and are
+retransmitted together, which keeps the queue well below queue_limit on
+average. Estimates whose queue reaches queue_limit are therefore outside the
+model's validity range, see in_validity_range().
+
+**AimdHost**: The window follows the delay differential equation of Misra,
+Gong and Towsley's TCP fluid model. It grows by 1 / window per ACK and halves
+on loss, at most once per RTT (the next_decrease hysteresis). AimdHost detects
+a loss by fast retransmit once DUPACK_THRESHOLD later packets have arrived,
+i.e., an RTT plus DUPACK_THRESHOLD packets after the lost packet was sent, or
+by its timeout an RTO after it was sent, whichever comes first. The queue
+follows the difference between the send rate and the capacity.
+Both equations are integrated with Euler steps of a fraction of the current
+RTT, starting in slow start. Estimates are averages over the second half of
+the run, which ends early once the averages over two consecutive spans of
+doubling length agree to within TOLERANCE.
+
+The AIMD model assumes that the RTO stays above the RTT, i.e., that packets
+only time out when they are lost. The TimeoutCalculator's RTO drops to
+max(RTT, min_timeout) when the RTT is steady, so once the RTT reaches
+min_timeout, the few ticks of queueing that a burst of packets adds time out
+packets that were not lost. AimdHost then halves its window and backs off
+again and again, and gets a fraction of the throughput the model estimates:
+estimates with an RTT of min_timeout or more are outside the model's
+validity range, see in_validity_range().
+
+An estimate of a SlidingWindowHost takes microseconds. One of an AimdHost
+takes at most STEPS_PER_RTT steps per rtt_min of the run, but usually far
+fewer, as queueing lengthens the steps and the run ends at convergence: a
+few to ~150 milliseconds for 100000 ticks.
+validate() compares the estimates against the packet-level simulator on a
+standard set of configurations.
+"""
+
+import argparse
+import math
+import sys
+
+from aimd_host import AimdHost
+from hosts import create_host
+from simulator import Simulator
+from timeout_calculator import TimeoutCalculator
+
+# Euler steps per RTT when integrating the AIMD model
+STEPS_PER_RTT = 16
+# Steps of loss history the AIMD model keeps, enough for losses detected by
+# fast retransmit or by a timeout, whichever comes first
+LOSS_HISTORY = (AimdHost.DUPACK_THRESHOLD + 1) * STEPS_PER_RTT + 1
+# Length, in multiples of rtt_min, of the shortest span the AIMD model averages
+# over before checking whether it has converged
+MIN_SPAN_RTTS = 64
+# Relative difference below which the averages over two consecutive spans
+# count as converged
+TOLERANCE = 0.01
+
+# (host_type, window_size, rtt_min, loss_ratio, queue_limit) configurations
+# used by validate()
+VALIDATION_SET = [
+    ("slidingwindow", 5, 10, 0.0, 1000000),
+    ("slidingwindow", 50, 100, 0.0, 1000000),
+    ("slidingwindow", 80, 50, 0.0, 1000000),
+    ("slidingwindow", 50, 100, 0.01, 1000000),
+    ("slidingwindow", 200, 100, 0.0, 50),
+    ("aimd", None, 20, 0.0, 50),
+    ("aimd", None, 100, 0.01, 1000000),
+    ("aimd", None, 100, 0.0, 100),
+    ("aimd", None, 200, 0.001, 1000000),
+]
+
+# Estimated quantities, as reported by estimate() and measure()
+QUANTITIES = ["throughput", "queue", "rtt", "window"]
+
+
+def retransmission_timeout(rtt, min_timeout, max_timeout):
+    # TimeoutCalculator's timeout once the RTT has settled, i.e., with no RTT
+    # variance left
+    return min(max(rtt, min_timeout), max_timeout)
+
+
+def estimate_sliding_window(
+    window_size,
+    rtt_min,
+    loss_ratio,
+    queue_limit,
+    capacity=1,
+    min_timeout=TimeoutCalculator.MIN_TIMEOUT,
+    max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+):
+    """
+    Steady state of a SlidingWindowHost, see estimate() for the result.
+    """
+    rtt = rtt_min
+    rto = retransmission_timeout(rtt, min_timeout, max_timeout)
+    # time a window slot is held per packet sent, without queueing
+    holding = (1 - loss_ratio) * rtt + loss_ratio * rto
+    rate = window_size / holding
+    queue = 0.0
+    drop = loss_ratio
+    if rate > capacity:
+        # The link is saturated: the queue holds what the window has in excess
+        # of what the link and the pdbox can hold
+        rate = capacity
+        queue = (window_size / capacity - loss_ratio * rto) / (1 - loss_ratio) - rtt_min
+        queue = max(0.0, queue * capacity)
+        if queue > queue_limit:
+            # The rest of the excess is dropped at the queue, with probability
+            # queue_drop, and holds window slots until it times out
+            queue = queue_limit
+            rtt = rtt_min + queue / capacity
+            rto = retransmission_timeout(rtt, min_timeout, max_timeout)
+            excess = window_size - capacity * ((1 - loss_ratio) * rtt + loss_ratio * rto)
+            queue_drop = excess / (excess + capacity * rto)
+            drop = queue_drop + (1 - queue_drop) * loss_ratio
+        rtt = rtt_min + queue / capacity
+    return {
+        "throughput": rate * (1 - loss_ratio),
+        "queue": queue,
+        "rtt": rtt - 1,
+        "window": float(window_size),
+        "loss": drop,
+    }
+
+
+def estimate_aimd(
+    rtt_min,
+    loss_ratio,
+    queue_limit,
+    ticks,
+    capacity=1,
+    min_timeout=TimeoutCalculator.MIN_TIMEOUT,
+    max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+):
+    """
+    Steady state of an AimdHost over ticks ticks, see estimate() for the result.
+    """
+    window = 1.0
+    queue = 0.0
+    slow_start = True
+    # loss events per tick of the last LOSS_HISTORY steps, indexed by step
+    # modulo LOSS_HISTORY and read back when the losses are detected
+    loss_history = [0.0] * LOSS_HISTORY
+    # Averages are taken over spans [end / 2, end) whose end doubles up to ticks
+    end = ticks
+    while end / 2 >= MIN_SPAN_RTTS * rtt_min:
+        end /= 2
+    previous = None
+    totals = dict.fromkeys(QUANTITIES + ["loss"], 0.0)
+    time = 0.0
+    step = 0
+    while True:
+        rtt = rtt_min + queue / capacity
+        dt = rtt / STEPS_PER_RTT
+        rate = window / rtt
+        # Send rate beyond what the link serves and the queue absorbs is dropped
+        if queue >= queue_limit and rate > capacity:
+            queue_drop = (rate - capacity) / rate
+        else:
+            queue_drop = 0.0
+        drop = queue_drop + (1 - queue_drop) * loss_ratio
+        ack_rate = rate * (1 - drop)
+
+        # Losses are noticed by fast retransmit, or when the lost packets time
+        # out. The detection delay is at most DUPACK_THRESHOLD + 1 RTTs, so it
+        # fits in the loss history.
+        rto = retransmission_timeout(rtt, min_timeout, max_timeout)
+        detection = min(rto, rtt + AimdHost.DUPACK_THRESHOLD / rate)
+        delay = int(round(detection / dt))
+        losses = loss_history[(step - delay) % LOSS_HISTORY] if step >= delay else 0.0
+        loss_history[step % LOSS_HISTORY] = rate * drop
+        if losses > 0:
+            slow_start = False
+        increase = ack_rate if slow_start else ack_rate / window
+        # at most one decrease per RTT
+        decrease = window / 2 * min(losses, 1 / rtt)
+        window = max(1.0, window + (increase - decrease) * dt)
+        queue = min(max(0.0, queue + (rate * (1 - queue_drop) - capacity) * dt), queue_limit)
+        step += 1
+
+        if time >= end / 2:
+            # Time-weighted, as the steps follow the RTT
+            totals["throughput"] += min(ack_rate, capacity * (1 - loss_ratio)) * dt
+            totals["queue"] += queue * dt
+            totals["rtt"] += (rtt - 1) * dt
+            totals["window"] += window * dt
+            totals["loss"] += drop * dt
+        time += dt
+        if time >= end:
+            span = time - end / 2
+            averages = {name: total / span for name, total in totals.items()}
+            if time >= ticks or (
+                previous is not None
+                and all(
+                    math.isclose(averages[name], previous[name], rel_tol=TOLERANCE)
+                    for name in averages
+                )
+            ):
+                return averages
+            previous = averages
+            totals = dict.fromkeys(totals, 0.0)
+            end = min(2 * end, ticks)
+
+
+def estimate(
+    host_type,
+    window_size,
+    rtt_min,
+    loss_ratio,
+    queue_limit,
+    ticks=100000,
+    capacity=1,
+    min_timeout=TimeoutCalculator.MIN_TIMEOUT,
+    max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+):
+    """
+    Estimate the steady state of a simulation with the same parameters as the
+    simulator's command line.
+
+    Returns:
+
+        A dict with the throughput (ACKs per tick), the mean queue occupancy
+        (packets), the mean RTT (ticks), the mean window (packets) and the
+        fraction of packets lost ("loss")
+    """
+    if host_type == "slidingwindow":
+        return estimate_sliding_window(
+            window_size,
+            rtt_min,
+            loss_ratio,
+            queue_limit,
+            capacity,
+            min_timeout,
+            max_timeout,
+        )
+    elif host_type == "aimd":
+        return estimate_aimd(
+            rtt_min, loss_ratio, queue_limit, ticks, capacity, min_timeout, max_timeout
+        )
+    raise ValueError("The fluid model supports slidingwindow and aimd hosts only")
+
+
+def in_validity_range(
+    host_type, estimated, queue_limit, min_timeout=TimeoutCalculator.MIN_TIMEOUT
+):
+    """
+    Whether the estimate estimated of estimate() is in the range where the
+    model holds, see the module docstring. For SlidingWindowHost, its queue
+    must stay below queue_limit; for AimdHost, its RTT must stay below the
+    minimum timeout.
+    """
+    if host_type == "aimd":
+        return estimated["rtt"] < min_timeout
+    return estimated["queue"] < queue_limit
+
+
+def measure(host_type, window_size, rtt_min, loss_ratio, queue_limit, ticks, seed=1):
+    """
+    Run the packet-level simulator and measure the same quantities as
+    estimate() (except loss) over the second half of the run.
+    """
+    host = create_host(
+        host_type,
+        window_size,
+        TimeoutCalculator.MIN_TIMEOUT,
+        TimeoutCalculator.MAX_TIMEOUT,
+        verbose=False,
+    )
+    simulator = Simulator(host, loss_ratio, queue_limit, rtt_min, seed, verbose=False)
+    start = ticks // 2
+    rtt_samples = []
+
+    def observe(tick, rtt_sample):
+        if tick >= start:
+            rtt_samples.append(rtt_sample)
+
+    host.rtt_observer = observe
+    queue = 0
+    window = 0.0
+    for tick in range(0, ticks):
+        simulator.tick(tick)
+        if tick >= start:
+            queue += simulator.link.link_queue.qsize()
+            window += host.window
+    samples = ticks - start
+    return {
+        "throughput": len(rtt_samples) / samples,
+        "queue": queue / samples,
+        "rtt": sum(rtt_samples) / len(rtt_samples) if rtt_samples else math.nan,
+        "window": window / samples,
+    }
+
+
+def relative_error(estimated, measured):
+    if measured == 0:
+        return 0.0 if estimated == 0 else math.inf
+    return abs(estimated - measured) / abs(measured)
+
+
+def validate(cases=VALIDATION_SET, ticks=50000):
+    """
+    Compare estimate() against measure() for every configuration in cases.
+    Returns a list of dicts with the configuration, the estimated and measured
+    quantities, their relative errors and whether the configuration is in the
+    model's validity range ("in_range").
+    """
+    results = []
+    for host_type, window_size, rtt_min, loss_ratio, queue_limit in cases:
+        estimated = estimate(host_type, window_size, rtt_min, loss_ratio, queue_limit, ticks)
+        measured = measure(host_type, window_size, rtt_min, loss_ratio, queue_limit, ticks)
+        results.append(
+            {
+                "host_type": host_type,
+                "window_size": window_size,
+                "rtt_min": rtt_min,
+                "loss_ratio": loss_ratio,
+                "queue_limit": queue_limit,
+                "estimated": estimated,
+                "measured": measured,
+                "error": {
+                    name: relative_error(estimated[name], measured[name])
+                    for name in QUANTITIES
+                },
+                "in_range": in_validity_range(host_type, estimated, queue_limit),
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fluid-model estimates of steady-state throughput and queue occupancy"
+    )
+    parser.add_argument("--host_type", dest="host_type", choices=["slidingwindow", "aimd"])
+    parser.add_argument("--window_size", dest="window_size", type=int)
+    parser.add_argument("--rtt_min", dest="rtt_min", type=int)
+    parser.add_argument("--loss_ratio", dest="loss_ratio", type=float, default=0.0)
+    parser.add_argument("--queue_limit", dest="queue_limit", type=int, default=1000000)
+    parser.add_argument("--ticks", dest="ticks", type=int, default=100000)
+    parser.add_argument("--capacity", dest="capacity", type=int, default=1)
+    parser.add_argument(
+        "--validate",
+        dest="validate",
+        action="store_true",
+        help="Compare the model against the simulator on the validation set",
+    )
+    args = parser.parse_args()
+
+    if args.validate:
+        print(
+            "%-14s %6s %5s %6s %8s  %s  %s"
+            % ("host_type", "window", "rtt", "loss", "queue", "  ".join(
+                "%-26s" % (name + " est/sim/err") for name in QUANTITIES
+            ), "in range")
+        )
+        for result in validate(ticks=args.ticks):
+            print(
+                "%-14s %6s %5d %6.3f %8d  %s  %s"
+                % (
+                    result["host_type"],
+                    result["window_size"],
+                    result["rtt_min"],
+                    result["loss_ratio"],
+                    result["queue_limit"],
+                    "  ".join(
+                        "%8.2f %8.2f %7.1f%%"
+                        % (
+                            result["estimated"][name],
+                            result["measured"][name],
+                            100 * result["error"][name],
+                        )
+                        for name in QUANTITIES
+                    ),
+                    "yes" if result["in_range"] else "no",
+                )
+            )
+    else:
+        if args.host_type is None or args.rtt_min is None:
+            parser.error("--host_type and --rtt_min are required unless --validate")
+        if args.host_type == "slidingwindow" and args.window_size is None:
+            parser.error("--window_size is required for slidingwindow")
+        result = estimate(
+            args.host_type,
+            args.window_size,
+            args.rtt_min,
+            args.loss_ratio,
+            args.queue_limit,
+            args.ticks,
+            args.capacity,
+        )
+        for name, value in result.items():
+            print("%s: %.4f" % (name, value))
+        if not in_validity_range(args.host_type, result, args.queue_limit):
+            print(
+                "warning: the estimate is outside the model's validity range (the "
+                "queue overflows, or the RTT reaches the minimum timeout of %d)"
+                % TimeoutCalculator.MIN_TIMEOUT,
+                file=sys.stderr,
+            )
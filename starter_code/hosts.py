@@ -0,0 +1,117 @@
+"""
+Registry of host types, i.e., of the protocols a host can follow.
+
+Each host type is registered under a lower-case name together with the module
+and class implementing it. Modules are only imported when a host of that type
+is created, so listing or checking host types costs no imports, and a new
+protocol becomes available everywhere (simulator.py --host_type, multi_flow.py,
+fluid_model.py, ...) by registering it, without editing the simulator:
+
+    hosts.register_host("bbr", "bbr_host", "BbrHost")
+
+Hosts are created as Class(verbose=..., min_timeout=..., max_timeout=...,
+tracer=...), plus window_size=... for host types registered with
+window_size=True, plus any host-specific options given to create_host()
+(e.g., pacing_gain); create_host() rejects options the host type does not
+take.
+
+Modules listed in the SIMULATOR_HOST_MODULES environment variable (separated by
+commas) are imported the first time a host type is not found, so that command
+line tools pick up out-of-tree protocols that register themselves on import.
+"""
+
+import argparse
+import importlib
+import inspect
+import os
+
+# Dict from host type to (module, class name, whether the host takes a
+# window_size)
+HOSTS = {
+    "stopandwait": ("stop_and_wait_host", "StopAndWaitHost", False),
+    "slidingwindow": ("sliding_window_host", "SlidingWindowHost", True),
+    "aimd": ("aimd_host", "AimdHost", False),
+    "cubic": ("aimd_host", "CubicHost", False),
+    "vegas": ("aimd_host", "VegasHost", False),
+}
+
+# Whether the modules in SIMULATOR_HOST_MODULES have been imported
+_plugins_loaded = False
+
+
+def register_host(host_type, module, class_name, window_size=False):
+    """
+    Register class_name in module as host type host_type (case-insensitive).
+    """
+    HOSTS[host_type.lower()] = (module, class_name, window_size)
+
+
+def load_plugins():
+    # Import the modules in SIMULATOR_HOST_MODULES, which register their hosts
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+    for module in os.environ.get("SIMULATOR_HOST_MODULES", "").split(","):
+        if module.strip():
+            importlib.import_module(module.strip())
+
+
+def host_types():
+    """
+    Return the names of all registered host types.
+    """
+    load_plugins()
+    return sorted(HOSTS)
+
+
+def check_host_type(host_type):
+    # Check that host_type is registered, for use as an argparse type
+    host_type = host_type.lower()
+    if host_type not in HOSTS:
+        load_plugins()
+    if host_type not in HOSTS:
+        raise argparse.ArgumentTypeError(
+            "Invalid host_type, must be one of %s" % ", ".join(host_types())
+        )
+    return host_type
+
+
+def host_class(host_type):
+    """
+    Import and return the class implementing host_type.
+    """
+    module, class_name, _ = HOSTS[check_host_type(host_type)]
+    return getattr(importlib.import_module(module), class_name)
+
+
+def create_host(
+    host_type,
+    window_size,
+    min_timeout,
+    max_timeout,
+    verbose=True,
+    tracer=None,
+    **options
+):
+    # Create a host based on the host_type, i.e., what protocol the host follows
+    host_type = check_host_type(host_type)
+    kwargs = dict(options)
+    kwargs.update(
+        verbose=verbose, min_timeout=min_timeout, max_timeout=max_timeout, tracer=tracer
+    )
+    if HOSTS[host_type][2]:
+        if window_size is None:
+            raise argparse.ArgumentTypeError(
+                "window_size must be defined for host_type %s" % host_type
+            )
+        kwargs["window_size"] = window_size
+    cls = host_class(host_type)
+    parameters = inspect.signature(cls).parameters
+    if not any(p.kind == p.VAR_KEYWORD for p in parameters.values()):
+        unsupported = sorted(set(options) - set(parameters))
+        if unsupported:
+            raise argparse.ArgumentTypeError(
+                "%s not supported by host_type %s" % (", ".join(unsupported), host_type)
+            )
+    return cls(**kwargs)
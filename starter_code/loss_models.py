@@ -0,0 +1,165 @@
+"""
+Loss models for Link.
+
+A loss model decides, for every packet the link dequeues, whether the packet is
+lost. Each model draws from its own NumPy Generator, seeded from the
+simulator's seed, so two simulators in the same process never share a random
+number stream and every run is reproducible from its seed. Random numbers are
+drawn in blocks of BLOCK_SIZE, instead of one call into the random number
+generator per packet, and kept in a compact array('d').
+
+**BernoulliLoss**: Every packet is lost independently with probability
+loss_ratio (the simulator's --loss_ratio)
+
+**GilbertElliottLoss**: Bursty losses. A two-state Markov chain (good and bad)
+moves on every packet, and packets are lost with a different probability in
+each state
+
+**TraceLoss**: Losses replayed from a trace of 0s and 1s (1 means lost), read
+in a loop; deterministic regardless of the seed
+"""
+
+from array import array
+
+import numpy as np
+
+# Number of random numbers drawn from the generator at a time
+BLOCK_SIZE = 4096
+
+
+class LossModel:
+    """
+    Base class of loss models. Subclasses implement lost(), which is called once
+    per dequeued packet and returns True if the packet is lost. Data members of
+    this class are
+
+    **rng**: NumPy Generator the model draws from
+
+    **block**: Uniform random numbers in [0, 1) drawn from rng but not used yet,
+    from index on
+    """
+
+    def __init__(self, seed=None):
+        self.reseed(seed)
+
+    def reseed(self, seed):
+        """
+        Restart the model's random number stream from seed (an int, a NumPy
+        SeedSequence or None for a fresh unpredictable stream).
+        """
+        self.rng = np.random.default_rng(seed)
+        self.block = array("d")
+        self.index = 0
+
+    def uniform(self):
+        # Next uniform random number in [0, 1), drawing a new block if needed
+        if self.index == len(self.block):
+            self.block = array("d", self.rng.random(BLOCK_SIZE).tobytes())
+            self.index = 0
+        value = self.block[self.index]
+        self.index += 1
+        return value
+
+    def lost(self):
+        raise NotImplementedError
+
+
+class BernoulliLoss(LossModel):
+    """
+    Independent losses with probability loss_ratio. loss_ratio may be changed at
+    any time; with a loss_ratio of 0 no random numbers are drawn.
+    """
+
+    def __init__(self, loss_ratio, seed=None):
+        super().__init__(seed)
+        self.loss_ratio = loss_ratio
+
+    def lost(self):
+        if self.loss_ratio == 0:
+            return False
+        return self.uniform() < self.loss_ratio
+
+
+class GilbertElliottLoss(LossModel):
+    """
+    Gilbert-Elliott burst losses. Data members of this class are
+
+    **p_good_to_bad**: Probability of moving from the good to the bad state,
+    per packet
+
+    **p_bad_to_good**: Probability of moving from the bad to the good state,
+    per packet
+
+    **loss_good**: Loss probability in the good state
+
+    **loss_bad**: Loss probability in the bad state
+
+    **bad**: Whether the chain is in the bad state
+
+    The mean burst length is 1 / p_bad_to_good packets.
+    """
+
+    def __init__(
+        self, p_good_to_bad, p_bad_to_good, loss_good=0.0, loss_bad=1.0, seed=None
+    ):
+        super().__init__(seed)
+        self.p_good_to_bad = p_good_to_bad
+        self.p_bad_to_good = p_bad_to_good
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    @property
+    def loss_ratio(self):
+        # Long-run fraction of packets lost
+        transitions = self.p_good_to_bad + self.p_bad_to_good
+        if transitions == 0:
+            return self.loss_bad if self.bad else self.loss_good
+        return (
+            self.p_bad_to_good * self.loss_good + self.p_good_to_bad * self.loss_bad
+        ) / transitions
+
+    def lost(self):
+        if self.bad:
+            if self.uniform() < self.p_bad_to_good:
+                self.bad = False
+        elif self.uniform() < self.p_good_to_bad:
+            self.bad = True
+        return self.uniform() < (self.loss_bad if self.bad else self.loss_good)
+
+
+class TraceLoss(LossModel):
+    """
+    Losses replayed from trace, a sequence of 0s and 1s with one entry per
+    dequeued packet; 1 means the packet is lost. The trace is replayed in a
+    loop, starting at entry offset. It draws no random numbers, so reseeding
+    does not affect it.
+    """
+
+    def __init__(self, trace, offset=0):
+        super().__init__()
+        self.trace = [bool(entry) for entry in trace]
+        if len(self.trace) == 0:
+            raise ValueError("Loss trace is empty")
+        # index of the entry for the next dequeued packet
+        self.position = offset % len(self.trace)
+
+    @property
+    def loss_ratio(self):
+        return sum(self.trace) / len(self.trace)
+
+    def lost(self):
+        lost = self.trace[self.position]
+        self.position += 1
+        if self.position == len(self.trace):
+            self.position = 0
+        return lost
+
+
+def load_loss_trace(path):
+    """
+    Read a loss trace for TraceLoss from a text file of 0s and 1s separated by
+    whitespace.
+    """
+    with open(path) as trace_file:
+        return [int(entry) for entry in trace_file.read().split()]
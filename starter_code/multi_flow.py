@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Several hosts (flows) sharing one bottleneck link.
+
+MultiFlowHost bundles any mix of StopAndWaitHost, SlidingWindowHost and AimdHost
+objects behind the same send/recv interface as a single host, so it plugs into
+Simulator unchanged: packets from all flows go through the same Link and
+DelayBox, and ACKs are demultiplexed back to the right host by pkt.flow_id.
+
+Only flows that have something to do on a tick are sent to. Each flow has a
+wakeup tick, given by its next_event_tick() method, and the wakeups are kept in
+a heap, so a tick costs O(number of active flows), not O(number of flows).
+A flow's wakeup is recomputed only after it sent or received packets.
+"""
+
+import argparse
+import heapq
+
+from hosts import check_host_type, create_host
+from packet import Packet
+from simulator import Simulator
+from timeout_calculator import TimeoutCalculator
+
+
+class MultiFlowHost:
+    """
+    A group of hosts that looks like one host to the Simulator. Data members of
+    this class are
+
+    **hosts**: List of hosts; the index of a host is its flow_id
+
+    **wakeups**: Heap of (tick, flow_id) at which flows want to send
+
+    **wake_tick**: For each flow, the tick of its live entry in wakeups, or None
+
+    **dirty**: Flows whose wakeup must be recomputed because they sent or
+    received packets since it was last computed
+
+    **always_active**: Flows whose host has no next_event_tick() method; they
+    are sent to on every tick
+    """
+
+    def __init__(self, hosts):
+        self.hosts = list(hosts)
+        self.wakeups = []
+        self.wake_tick = [None] * len(self.hosts)
+        # whether each flow is woken up through wakeups
+        self.scheduled = [hasattr(host, "next_event_tick") for host in self.hosts]
+        self.always_active = [
+            flow_id for flow_id in range(len(self.hosts)) if not self.scheduled[flow_id]
+        ]
+        self.dirty = {
+            flow_id for flow_id in range(len(self.hosts)) if self.scheduled[flow_id]
+        }
+
+    @property
+    def packet_pool(self):
+        # The pool of the flows that recycle their packets, see Simulator
+        for host in self.hosts:
+            if hasattr(host, "packet_pool"):
+                return host.packet_pool
+        return None
+
+    @packet_pool.setter
+    def packet_pool(self, pool):
+        for host in self.hosts:
+            if hasattr(host, "packet_pool"):
+                host.packet_pool = pool
+
+    def refresh(self, tick):
+        # Recompute the wakeups of flows whose state changed
+        for flow_id in self.dirty:
+            wakeup = self.hosts[flow_id].next_event_tick(tick)
+            if wakeup != self.wake_tick[flow_id]:
+                self.wake_tick[flow_id] = wakeup
+                if wakeup is not None:
+                    heapq.heappush(self.wakeups, (wakeup, flow_id))
+        self.dirty.clear()
+
+    def send(self, tick):
+        """
+        Call send() on every flow that has work to do at tick and return all
+        of their packets, tagged with their flow_id.
+        """
+        self.refresh(tick)
+        active = list(self.always_active)
+        while self.wakeups and self.wakeups[0][0] <= tick:
+            wakeup, flow_id = heapq.heappop(self.wakeups)
+            # skip entries that were superseded by a later refresh
+            if self.wake_tick[flow_id] == wakeup:
+                self.wake_tick[flow_id] = None
+                active.append(flow_id)
+        # Flows send in flow_id order, to keep runs deterministic
+        active.sort()
+
+        pkts = []
+        for flow_id in active:
+            flow_pkts = self.hosts[flow_id].send(tick)
+            if flow_pkts is None:
+                flow_pkts = []
+            elif type(flow_pkts) is Packet:
+                flow_pkts = [flow_pkts]
+            for pkt in flow_pkts:
+                pkt.flow_id = flow_id
+            pkts += flow_pkts
+            if self.scheduled[flow_id]:
+                self.dirty.add(flow_id)
+        return pkts
+
+    def recv(self, pkt, tick):
+        # Deliver the ACK to the flow that sent the packet
+        self.hosts[pkt.flow_id].recv(pkt, tick)
+        if self.scheduled[pkt.flow_id]:
+            self.dirty.add(pkt.flow_id)
+
+    def next_event_tick(self, tick):
+        """
+        Earliest tick at or after tick at which some flow wants to send, or
+        None if no flow has anything to do.
+        """
+        if self.always_active:
+            return tick
+        self.refresh(tick)
+        while self.wakeups:
+            wakeup, flow_id = self.wakeups[0]
+            if self.wake_tick[flow_id] == wakeup:
+                return max(tick, wakeup)
+            heapq.heappop(self.wakeups)
+        return None
+
+    def goodput(self, ticks):
+        """
+        Return the goodput of each flow, in packets per tick, over ticks ticks.
+        Goodput counts packets received in order, i.e., in_order_rx_seq + 1.
+        """
+        return [(host.in_order_rx_seq + 1) / ticks for host in self.hosts]
+
+    def report(self, ticks):
+        """
+        Return a dict with the per-flow goodput, the aggregate goodput and
+        Jain's fairness index of the per-flow goodputs (1 means perfectly fair).
+        """
+        per_flow = self.goodput(ticks)
+        aggregate = sum(per_flow)
+        squares = sum(goodput * goodput for goodput in per_flow)
+        if squares == 0:
+            fairness = 1.0
+        else:
+            fairness = aggregate * aggregate / (len(per_flow) * squares)
+        return {"per_flow": per_flow, "aggregate": aggregate, "fairness": fairness}
+
+
+def parse_flows(spec):
+    # Parse HOST_TYPE[:COUNT], e.g., aimd:10
+    host_type, _, count = spec.partition(":")
+    return check_host_type(host_type), int(count) if count else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Simulate several flows sharing one link. Link capacity is 1 packet per tick unless --capacity is given"
+    )
+    parser.add_argument(
+        "--flows",
+        dest="flows",
+        type=parse_flows,
+        nargs="+",
+        required=True,
+        help="Flows to simulate as HOST_TYPE[:COUNT], e.g., aimd:10 slidingwindow:5",
+    )
+    parser.add_argument("--seed", dest="seed", type=int, required=True)
+    parser.add_argument("--rtt_min", dest="rtt_min", type=int, required=True)
+    parser.add_argument("--ticks", dest="ticks", type=int, required=True)
+    parser.add_argument("--loss_ratio", dest="loss_ratio", type=float, default=0.0)
+    parser.add_argument("--queue_limit", dest="queue_limit", type=int, default=1000000)
+    parser.add_argument("--capacity", dest="capacity", type=int, default=1)
+    parser.add_argument(
+        "--window_size",
+        dest="window_size",
+        type=int,
+        help="Window size in packets for sliding window flows",
+    )
+    parser.add_argument(
+        "--min_timeout", dest="min_timeout", type=int, default=TimeoutCalculator.MIN_TIMEOUT
+    )
+    parser.add_argument(
+        "--max_timeout", dest="max_timeout", type=int, default=TimeoutCalculator.MAX_TIMEOUT
+    )
+    args = parser.parse_args()
+
+    hosts = []
+    for host_type, count in args.flows:
+        for _ in range(count):
+            hosts.append(
+                create_host(
+                    host_type,
+                    args.window_size,
+                    args.min_timeout,
+                    args.max_timeout,
+                    verbose=False,
+                )
+            )
+    flows = MultiFlowHost(hosts)
+    simulator = Simulator(
+        flows,
+        args.loss_ratio,
+        args.queue_limit,
+        args.rtt_min,
+        args.seed,
+        verbose=False,
+        capacity=args.capacity,
+    )
+    simulator.run(args.ticks)
+
+    report = flows.report(args.ticks)
+    for flow_id, goodput in enumerate(report["per_flow"]):
+        print(
+            "Flow %d (%s): goodput %.4f packets/tick, in order received sequence number %d"
+            % (
+                flow_id,
+                type(hosts[flow_id]).__name__,
+                goodput,
+                hosts[flow_id].in_order_rx_seq,
+            )
+        )
+    print("Aggregate goodput %.4f packets/tick" % report["aggregate"])
+    print("Jain's fairness index %.4f" % report["fairness"])
@@ -1,6 +1,12 @@
-# Required for dropping packets at random
-import queue
-import random
+import collections
+import heapq
+from array import array
+
+import numpy as np
+
+import event_trace
+from loss_models import BLOCK_SIZE, BernoulliLoss
+from ring_buffer import PacketRing
 
 
 class DelayBox:
@@ -8,52 +14,141 @@ class DelayBox:
     A class to delay packets by the propagation delay
     In our case, we'll use it to delay packets by the two-way propagation delay,
     i.e., RTT_min
+
+    With a constant delay, packets leave in the order they arrived, so they are
+    kept in a FIFO and each tick only looks at the head of the FIFO.
+
+    With jitter, every packet gets an extra delay on top of prop_delay, so
+    packets may be reordered. jitter is either an int, for an extra delay drawn
+    uniformly from [0, jitter], or a function of the packet that returns the
+    extra delay in ticks. Uniform extra delays are drawn in blocks from the
+    box's own NumPy Generator, seeded with seed. Delayed packets are then kept in a calendar queue:
+    a dict from delivery tick to the packets due on that tick, plus a heap of
+    the delivery ticks in use. Either way, delivering packets costs
+    O(number of packets delivered), never a scan of everything in flight.
+
+    If pool is given, packets are given back to it after host.recv() returns.
     """
 
-    def __init__(self, prop_delay):
-        # queue of packets being delayed
-        self.prop_delay_queue = []
+    def __init__(self, prop_delay, jitter=0, pool=None, seed=None):
         # how much to delay them by
         self.prop_delay = prop_delay
+        # extra per-packet delay, see class docstring
+        self.jitter = jitter
+        # random number stream for uniform jitter, see reseed()
+        self.reseed(seed)
+        # queue of packets being delayed when there is no jitter
+        self.prop_delay_queue = collections.deque()
+        # calendar queue used with jitter: delivery tick -> list of packets
+        self.calendar = {}
+        # heap of delivery ticks that have an entry in calendar
+        self.due_ticks = []
+        # PacketPool that delivered packets are recycled into, if any
+        self.pool = pool
+
+    def reseed(self, seed):
+        # Restart the jitter stream from seed
+        self.rng = np.random.default_rng(seed)
+        # extra delays drawn from rng but not used yet, from jitter_index on
+        self.jitter_block = array("q")
+        self.jitter_index = 0
 
     def recv(self, pkt, tick):
         # enqueue packet after timestamping it
         pkt.pdbox_time = tick
-        self.prop_delay_queue += [pkt]
+        if not self.jitter:
+            self.prop_delay_queue.append(pkt)
+            return
+        if callable(self.jitter):
+            extra_delay = self.jitter(pkt)
+        else:
+            if self.jitter_index == len(self.jitter_block):
+                self.jitter_block = array(
+                    "q",
+                    self.rng.integers(
+                        0, self.jitter, BLOCK_SIZE, dtype=np.int64, endpoint=True
+                    ).tobytes(),
+                )
+                self.jitter_index = 0
+            extra_delay = self.jitter_block[self.jitter_index]
+            self.jitter_index += 1
+        assert extra_delay >= 0
+        due = tick + self.prop_delay + extra_delay
+        if due not in self.calendar:
+            self.calendar[due] = []
+            heapq.heappush(self.due_ticks, due)
+        self.calendar[due].append(pkt)
 
     def tick(self, tick, host):
         # execute this on every tick
-        # packets that are delivered this tick
-        to_deliver = []
-        for pkt in self.prop_delay_queue:
-            # if propagation delay has been exceeded
-            if pkt.pdbox_time + self.prop_delay <= tick:
-                assert pkt.pdbox_time + self.prop_delay == tick
-                to_deliver += [pkt]
-                # deliver to the host
+        queue = self.prop_delay_queue
+        while queue and queue[0].pdbox_time + self.prop_delay <= tick:
+            pkt = queue.popleft()
+            assert pkt.pdbox_time + self.prop_delay == tick
+            # deliver to the host
+            host.recv(pkt, tick)
+            if self.pool is not None:
+                self.pool.release(pkt)
+        while self.due_ticks and self.due_ticks[0] <= tick:
+            due = heapq.heappop(self.due_ticks)
+            assert due == tick
+            for pkt in self.calendar.pop(due):
                 host.recv(pkt, tick)
-        self.prop_delay_queue = [
-            x for x in self.prop_delay_queue if x not in to_deliver
-        ]
+                if self.pool is not None:
+                    self.pool.release(pkt)
+
+    def next_event_tick(self, tick):
+        """
+        Earliest tick at or after tick at which a delayed packet is due, or None
+        if no packets are being delayed.
+        """
+        candidates = []
+        if self.prop_delay_queue:
+            candidates.append(self.prop_delay_queue[0].pdbox_time + self.prop_delay)
+        if self.due_ticks:
+            candidates.append(self.due_ticks[0])
+        if len(candidates) == 0:
+            return None
+        return max(tick, min(candidates))
 
 
 class Link:
     """
-    A class to represent a link with a finite capacity of 1 packet per tick
-    We can generalize this to other capacities, but we're keeping the assignment simple
+    A class to represent a link with a finite capacity of capacity packets per tick
+    (1 by default, which is what the assignment uses)
+
+    Dequeued packets are lost according to loss_model (see loss_models.py). By
+    default that is a BernoulliLoss with loss_ratio, drawing from its own
+    random number stream seeded with seed.
     """
 
-    def __init__(self, loss_ratio, queue_limit, verbose=True):
-        # queue of packets at the link
-        self.link_queue = queue.Queue()
-        # probability of dropping packets when link dequeues them
-        self.loss_ratio = loss_ratio
+    def __init__(
+        self,
+        loss_ratio,
+        queue_limit,
+        verbose=True,
+        capacity=1,
+        pool=None,
+        tracer=None,
+        loss_model=None,
+        seed=None,
+    ):
+        # queue of packets at the link; dequeued packets are taken from pool
+        self.link_queue = PacketRing(queue_limit, pool=pool)
+        # decides which packets are dropped when the link dequeues them
+        if loss_model is None:
+            loss_model = BernoulliLoss(loss_ratio, seed)
+        self.loss_model = loss_model
         # Max size of queue in packets
         self.queue_limit = queue_limit
         # Whether to print statements
         self.verbose = verbose
+        # Where to record drops; echoes them as text if verbose
+        self.tracer = event_trace.default_tracer(tracer, verbose)
+        # Max. number of packets dequeued per tick
+        self.capacity = capacity
 
-    def recv(self, pkt):
+    def recv(self, pkt, tick=-1):
         """
         Function to receive a packet from a device connected at either
         ends of the link. Device here can represent an end host or any other
@@ -61,26 +156,43 @@ class Link:
 
         The device connected to the link needs to call the recv function to put
         packet on to the link. If link's queue is full, it starts dropping packets
-        and does not receive any more packets.
+        and does not receive any more packets. tick is only used to timestamp
+        drops in the event trace.
         """
         if self.link_queue.qsize() < self.queue_limit:
             self.link_queue.put(pkt)  # append to the queue
         else:
-            if self.verbose:
-                print("Link dropped packet because queue_limit was exceeded")
+            if self.tracer.enabled:
+                self.tracer.record(event_trace.QUEUE_DROP, tick, pkt.seq_num)
 
     def tick(self, tick, pdbox):
         # Execute on every tick
         """
         This function simulates what a link would do at each time instant (tick).
-        It dequeue packets and sends it to the propagation delay box
+        It dequeues up to capacity packets and sends them to the propagation delay box
         """
         # Dequeue from link queue if queue is not empty
-        if self.link_queue.qsize() != 0:
-            head = self.link_queue.get()
-            if random.uniform(0.0, 1) < (1 - self.loss_ratio):
+        if self.link_queue.qsize() == 0:
+            return
+        for head in self.link_queue.get_many(self.capacity):
+            if not self.loss_model.lost():
                 # dequeue and send to prop delay box
                 pdbox.recv(head, tick)
             else:
-                if self.verbose:
-                    print("@ tick ", tick, " link dropped a packet ")
+                if self.tracer.enabled:
+                    self.tracer.record(event_trace.LINK_DROP, tick, head.seq_num)
+                self.link_queue.pool.release(head)
+
+    @property
+    def loss_ratio(self):
+        # Long-run fraction of dequeued packets that are lost
+        return self.loss_model.loss_ratio
+
+    def next_event_tick(self, tick):
+        """
+        Earliest tick at or after tick at which the link has work to do, or None
+        if the link queue is empty.
+        """
+        if self.link_queue.qsize() != 0:
+            return tick
+        return None
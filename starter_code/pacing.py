@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Pacing for window-based hosts (SlidingWindowHost, AimdHost and its subclasses).
+
+Without pacing, a host sends its whole free window in the tick it frees up,
+and the burst queues up at the link. A Pacer instead spreads new packets
+evenly over the smoothed RTT: one packet every mean_rtt / (gain * window)
+ticks, i.e., at gain times the rate the window allows. A gain above 1 lets
+the window still fill up, and grow, within an RTT. Until the first RTT
+sample, the initial timeout stands in for the RTT, so the first window is
+spread out as well. Retransmissions are not paced.
+
+Pacing only removes the queueing that bursts cause. As long as the window is
+below the bandwidth-delay product, that is all the queueing there is, and
+pacing brings the whole delay distribution, tail included, down to about
+zero. It cannot shorten a standing queue: with a window above the
+bandwidth-delay product, window minus that product packets wait in the queue
+however they are spaced, and the tail delay stays the same. A host that loses
+fewer packets to bursts when paced (such as AimdHost with a short queue) also
+grows a larger window, so its p99 and max delay can even go up along with its
+goodput. Retransmission bursts after timeouts are not smoothed either.
+
+Run this module to compare the queueing delay (RTT sample beyond rtt_min) and
+goodput of the same configuration with and without pacing.
+"""
+
+import argparse
+import math
+
+from timeout_calculator import TimeoutCalculator
+
+
+class Pacer:
+    """
+    Pacing schedule of a host. Data members of this class are
+
+    **gain**: Pacing rate as a multiple of window / mean_rtt
+
+    **next_send_tick**: (Fractional) tick at which the next new packet may be
+    sent
+    """
+
+    def __init__(self, gain):
+        if gain <= 0:
+            raise ValueError("pacing gain must be positive")
+        self.gain = gain
+        self.next_send_tick = 0.0
+
+    def allow(self, tick):
+        # Whether another packet may be sent in tick
+        return self.next_send_tick < tick + 1
+
+    def sent(self, tick, window, timeout_calculator):
+        # Schedule the next packet after sending one in tick. Time spent idle or
+        # with a full window does not build up credit for a burst. Before the
+        # first RTT sample, the initial timeout stands in for the RTT.
+        rtt = timeout_calculator.mean_rtt or timeout_calculator.timeout
+        self.next_send_tick = max(self.next_send_tick, tick) + rtt / (
+            self.gain * window
+        )
+
+    def next_event_tick(self, tick):
+        # Earliest tick at or after tick at which allow() holds
+        return max(tick, math.floor(self.next_send_tick))
+
+
+def queue_delay_stats(
+    host_type,
+    window_size,
+    rtt_min,
+    loss_ratio,
+    queue_limit,
+    seed,
+    ticks,
+    pacing_gain=None,
+    min_timeout=TimeoutCalculator.MIN_TIMEOUT,
+    max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+):
+    """
+    Run one simulation and return a dict with its goodput (packets received in
+    order per tick) and the mean, p50, p99, p99.9 and max queueing delay of its
+    RTT samples, in ticks.
+    """
+    # imported here so that the hosts can import Pacer without the simulator
+    from hosts import create_host
+    from simulator import Simulator
+    from streaming_stats import RunStats
+
+    options = {} if pacing_gain is None else {"pacing_gain": pacing_gain}
+    host = create_host(
+        host_type, window_size, min_timeout, max_timeout, verbose=False, **options
+    )
+    simulator = Simulator(host, loss_ratio, queue_limit, rtt_min, seed, verbose=False)
+    stats = RunStats()
+    stats.attach(host)
+    simulator.run(ticks)
+    # RTT samples are rtt_min - 1 when the packet did not queue at all, as the
+    # ACK arrives after the host has sent on that tick
+    base_rtt = rtt_min - 1
+    return {
+        "goodput": (host.in_order_rx_seq + 1) / ticks,
+        "delay_mean": stats.rtt.mean - base_rtt,
+        "delay_p50": stats.rtt_quantiles.quantile(0.5) - base_rtt,
+        "delay_p99": stats.rtt_quantiles.quantile(0.99) - base_rtt,
+        "delay_p999": stats.rtt_quantiles.quantile(0.999) - base_rtt,
+        "delay_max": stats.rtt.max - base_rtt,
+    }
+
+
+def compare(pacing_gain, *args, **kwargs):
+    """
+    Return the queue_delay_stats() of a configuration without and with pacing
+    at pacing_gain, and the relative reduction of each delay statistic.
+    """
+    unpaced = queue_delay_stats(*args, **kwargs)
+    paced = queue_delay_stats(*args, pacing_gain=pacing_gain, **kwargs)
+    reduction = {
+        name: 1 - paced[name] / unpaced[name] if unpaced[name] > 0 else 0.0
+        for name in unpaced
+        if name.startswith("delay")
+    }
+    return unpaced, paced, reduction
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare queueing delay and goodput with and without pacing"
+    )
+    parser.add_argument("--host_type", dest="host_type", choices=["slidingwindow", "aimd", "cubic", "vegas"], required=True)
+    parser.add_argument("--window_size", dest="window_size", type=int)
+    parser.add_argument("--rtt_min", dest="rtt_min", type=int, required=True)
+    parser.add_argument("--loss_ratio", dest="loss_ratio", type=float, default=0.0)
+    parser.add_argument("--queue_limit", dest="queue_limit", type=int, default=1000000)
+    parser.add_argument("--seed", dest="seed", type=int, default=1)
+    parser.add_argument("--ticks", dest="ticks", type=int, default=100000)
+    parser.add_argument("--pacing_gain", dest="pacing_gain", type=float, default=1.25)
+    args = parser.parse_args()
+
+    unpaced, paced, reduction = compare(
+        args.pacing_gain,
+        args.host_type,
+        args.window_size,
+        args.rtt_min,
+        args.loss_ratio,
+        args.queue_limit,
+        args.seed,
+        args.ticks,
+    )
+    print("%-12s %12s %12s %10s" % ("", "unpaced", "paced", "reduction"))
+    for name in unpaced:
+        print(
+            "%-12s %12.2f %12.2f %10s"
+            % (
+                name,
+                unpaced[name],
+                paced[name],
+                "%.1f%%" % (100 * reduction[name]) if name in reduction else "",
+            )
+        )
@@ -10,8 +10,23 @@ class Packet:
 
     **retx**: To identify if the packet is a retransmission
 
+    **flow_id**: Which flow (host) the packet belongs to when several hosts
+    share the link
+
+    Packets use __slots__, so they have no per-instance __dict__ and new
+    attributes cannot be added to them.
     """
 
+    __slots__ = (
+        "sent_ts",
+        "seq_num",
+        "pdbox_time",
+        "num_retx",
+        "timeout_duration",
+        "timeout_tick",
+        "flow_id",
+    )
+
     def __init__(self, sent_ts, seq_num):
         self.sent_ts = sent_ts  # sent timestamp, used to compute RTTs
         self.seq_num = seq_num  # sequence number, starting from 0
@@ -19,7 +34,65 @@ class Packet:
         self.num_retx = 0  # how many times it's been retransmitted so far
         self.timeout_duration = 0  # what is the duration of its timeout
         self.timeout_tick = 0  # at what tick does this packet timeout?
+        self.flow_id = 0  # which host sent it, see MultiFlowHost
 
     def __repr__(self):
         # Debugging: printing a packet object displays its sequence number
         return str(self.seq_num)
+
+
+class PacketPool:
+    """
+    Free list of Packet objects, so that neither the network nor the hosts
+    allocate a new Packet for every packet sent. The link takes packets from the
+    pool when it dequeues them and the propagation delay box gives them back once
+    the host has processed them in recv(). Hosts must therefore not keep
+    references to packets passed to recv(). Window-based hosts take their new
+    packets from the same pool, keep them while they are unacked (the link only
+    copies their fields), and give them back when they are acked.
+
+    **free**: Packets available for reuse
+
+    **max_free**: Max. number of packets kept in the free list
+
+    **allocated**: Number of packets created by the pool so far
+
+    **reused**: Number of packets handed out from the free list so far
+    """
+
+    def __init__(self, max_free=4096):
+        self.free = []
+        self.max_free = max_free
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, sent_ts, seq_num):
+        """
+        Return a packet with all fields set exactly as Packet(sent_ts, seq_num) would.
+        """
+        if not self.free:
+            self.allocated += 1
+            return Packet(sent_ts, seq_num)
+        self.reused += 1
+        pkt = self.free.pop()
+        pkt.sent_ts = sent_ts
+        pkt.seq_num = seq_num
+        pkt.pdbox_time = -1
+        pkt.num_retx = 0
+        pkt.timeout_duration = 0
+        pkt.timeout_tick = 0
+        pkt.flow_id = 0
+        return pkt
+
+    def __getstate__(self):
+        # The free list does not affect results, so checkpoints leave it out
+        state = dict(self.__dict__)
+        state["free"] = []
+        return state
+
+    def release(self, pkt):
+        """
+        Give pkt back to the pool. pkt must not be used by the caller afterwards.
+        """
+        if len(self.free) < self.max_free:
+            self.free.append(pkt)
@@ -0,0 +1,237 @@
+"""
+Per-component profiling of Simulator.tick().
+
+A Profiler attached to a Simulator times each component of a tick separately
+and counts what happened to the packets:
+
+**host.send**: The host generating packets (new ones and retransmissions)
+
+**link.recv**: Enqueueing the packets at the link
+
+**link.tick**: The link dequeueing packets, drawing losses and passing the
+survivors to the pdbox
+
+**pdbox.tick**: The pdbox delivering due packets, not counting host.recv
+
+**host.recv**: The host processing ACKs
+
+**recorder**: Sampling the simulator state, if a Recorder is attached
+
+Attach a profiler with Profiler.attach(simulator). Simulator.tick() calls
+back into it between its components, so profiled runs simulate exactly what
+unprofiled ones do (see check()); when no profiler is attached, each callback
+costs Simulator.tick() a check of a local variable.
+"""
+
+import time
+
+from hosts import create_host
+from simulator import Simulator
+from timeout_calculator import TimeoutCalculator
+
+# Components in the order they run within a tick
+COMPONENTS = ["host.send", "link.recv", "link.tick", "pdbox.tick", "host.recv", "recorder"]
+
+# Components that make up the host and the network, for Profiler.bound()
+HOST_COMPONENTS = ["host.send", "host.recv"]
+NETWORK_COMPONENTS = ["link.recv", "link.tick", "pdbox.tick"]
+
+# Packet events counted by the profiler
+EVENTS = ["sent", "retransmitted", "enqueued", "queue_dropped", "link_dropped", "delivered"]
+
+
+class CountingReceiver:
+    """
+    Stands in for the receiver of a component's tick() (the pdbox for the link,
+    the host for the pdbox) to count the packets passed to it, and optionally
+    time the receiver's recv().
+    """
+
+    def __init__(self, receiver, profiler=None):
+        self.receiver = receiver
+        self.profiler = profiler
+        self.count = 0
+
+    def recv(self, pkt, tick):
+        self.count += 1
+        if self.profiler is None:
+            self.receiver.recv(pkt, tick)
+            return
+        start = time.perf_counter()
+        self.receiver.recv(pkt, tick)
+        self.profiler.add_nested("host.recv", time.perf_counter() - start)
+
+
+class Profiler:
+    """
+    Cumulative time, call counts and packet event counts of a Simulator's
+    components. Data members of this class are
+
+    **seconds**: Dict from component to the wall time spent in it
+
+    **calls**: Dict from component to the number of times it was called
+
+    **events**: Dict from packet event (see EVENTS) to its count
+
+    **ticks**: Number of ticks profiled
+
+    Simulator.tick() calls start() at the beginning of every tick and lap()
+    at the end of every component, so the profiled and the unprofiled tick
+    run the same code.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(COMPONENTS, 0.0)
+        self.calls = dict.fromkeys(COMPONENTS, 0)
+        self.events = dict.fromkeys(EVENTS, 0)
+        self.ticks = 0
+        # state of the current tick: the link, the counting receivers, the
+        # link queue occupancy and the clock at the last lap, and the time
+        # spent since then in components nested within the current one
+        self.link = None
+        self.pdbox = None
+        self.host = None
+        self.queued = 0
+        self.last = 0.0
+        self.nested = 0.0
+
+    def attach(self, simulator):
+        """
+        Start profiling every tick of simulator.
+        """
+        simulator.profiler = self
+
+    def add(self, component, seconds):
+        self.seconds[component] += seconds
+        self.calls[component] += 1
+
+    def add_nested(self, component, seconds):
+        # Account for a component that runs within the current one
+        self.add(component, seconds)
+        self.nested += seconds
+
+    def start(self, simulator):
+        """
+        Start profiling a tick of simulator. Returns the receivers to pass to
+        link.tick() and pdbox.tick() instead of the pdbox and the host.
+        """
+        self.ticks += 1
+        self.link = simulator.link
+        self.pdbox = CountingReceiver(simulator.pdbox)
+        self.host = CountingReceiver(simulator.host, self)
+        self.queued = self.link.link_queue.qsize()
+        self.nested = 0.0
+        self.last = time.perf_counter()
+        return self.pdbox, self.host
+
+    def lap(self, component, packets=None):
+        """
+        Account for component, which has just ended, and count its packet
+        events. packets are those sent by the host, for link.recv.
+        """
+        elapsed = time.perf_counter() - self.last - self.nested
+        self.add(component, elapsed)
+        self.nested = 0.0
+        queued = self.link.link_queue.qsize()
+        events = self.events
+        if component == "link.recv":
+            enqueued = queued - self.queued
+            events["sent"] += len(packets)
+            events["retransmitted"] += sum(1 for packet in packets if packet.num_retx)
+            events["enqueued"] += enqueued
+            events["queue_dropped"] += len(packets) - enqueued
+        elif component == "link.tick":
+            events["link_dropped"] += self.queued - queued - self.pdbox.count
+        elif component == "pdbox.tick":
+            events["delivered"] += self.host.count
+        self.queued = queued
+        # the profiler's own bookkeeping is not part of the next component
+        self.last = time.perf_counter()
+
+    def bound(self):
+        """
+        Return "host" or "network", whichever of the two took more time.
+        """
+        host = sum(self.seconds[component] for component in HOST_COMPONENTS)
+        network = sum(self.seconds[component] for component in NETWORK_COMPONENTS)
+        return "host" if host >= network else "network"
+
+    def report(self):
+        """
+        Return the profile as a human-readable table.
+        """
+        total = sum(self.seconds.values())
+        lines = [
+            "%-12s %10s %8s %12s %12s"
+            % ("component", "seconds", "%", "calls", "us/call")
+        ]
+        for component in COMPONENTS:
+            calls = self.calls[component]
+            if calls == 0:
+                continue
+            seconds = self.seconds[component]
+            lines.append(
+                "%-12s %10.3f %7.1f%% %12d %12.2f"
+                % (
+                    component,
+                    seconds,
+                    100.0 * seconds / total if total else 0.0,
+                    calls,
+                    1e6 * seconds / calls,
+                )
+            )
+        lines.append("%d ticks, %s-bound" % (self.ticks, self.bound()))
+        lines.append(
+            ", ".join("%s %d" % (event, self.events[event]) for event in EVENTS)
+        )
+        return "\n".join(lines)
+
+
+def check(
+    host_type,
+    window_size=None,
+    rtt_min=20,
+    loss_ratio=0.01,
+    queue_limit=100,
+    ticks=20000,
+    seed=1,
+):
+    """
+    Run the same simulation with and without a profiler attached and return
+    the names of the state variables in which they end up differing.
+    """
+    states = []
+    for profiled in (False, True):
+        host = create_host(
+            host_type,
+            window_size,
+            TimeoutCalculator.MIN_TIMEOUT,
+            TimeoutCalculator.MAX_TIMEOUT,
+            verbose=False,
+        )
+        simulator = Simulator(host, loss_ratio, queue_limit, rtt_min, seed, verbose=False)
+        if profiled:
+            Profiler().attach(simulator)
+        for tick in range(0, ticks):
+            simulator.tick(tick)
+        states.append(
+            {
+                "in_order_rx_seq": host.in_order_rx_seq,
+                "max_seq": host.max_seq,
+                "window": host.window,
+                "timeout": host.timeout_calculator.timeout,
+                "mean_rtt": host.timeout_calculator.mean_rtt,
+                "queue": simulator.link.link_queue.qsize(),
+            }
+        )
+    unprofiled, profiled = states
+    return [name for name in unprofiled if unprofiled[name] != profiled[name]]
+
+
+if __name__ == "__main__":
+    for host_type, window_size in (("slidingwindow", 40), ("aimd", None)):
+        mismatches = check(host_type, window_size)
+        if mismatches:
+            print("%s: profiled run differs in %s" % (host_type, mismatches))
+        else:
+            print("%s: profiled run matches the unprofiled one" % host_type)
@@ -0,0 +1,169 @@
+"""
+Per-tick time series of simulator state, written to memory-mapped NumPy files.
+
+The recorder samples the simulator every interval ticks and writes one row per
+sample to these columns:
+
+**tick**: Tick of the sample
+
+**queue_depth**: Number of packets in the link queue (Link.link_queue)
+
+**window**: Host window size, NaN for hosts without a window
+
+**timeout**: Current timeout of the host's TimeoutCalculator
+
+**mean_rtt**: Current mean RTT of the host's TimeoutCalculator
+
+It also records every RTT sample the host computes in recv(), in the columns
+rtt_tick and rtt_sample.
+
+Each column is a .npy file in the output directory, preallocated for the whole
+run and filled through a memory map, so a run of any length is recorded without
+holding it in RAM. load_recording() memory-maps the files back, which is
+instant regardless of their size.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+# dtype of each sampled column
+COLUMNS = {
+    "tick": np.int64,
+    "queue_depth": np.int64,
+    "window": np.float64,
+    "timeout": np.float64,
+    "mean_rtt": np.float64,
+}
+
+# dtype of each RTT sample column
+RTT_COLUMNS = {"rtt_tick": np.int64, "rtt_sample": np.float64}
+
+
+class Recorder:
+    """
+    Records a Simulator run to directory. Data members of this class are
+
+    **interval**: Sampling interval in ticks
+
+    **next_sample**: Tick of the next row to be written
+
+    **rows**: Number of sampled rows written so far
+
+    **rtt_rows**: Number of RTT samples written so far
+
+    **rtt_dropped**: Number of RTT samples that did not fit in rtt_capacity
+    """
+
+    def __init__(self, directory, ticks, interval=1, rtt_capacity=None, start_tick=0):
+        self.directory = directory
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+        # first sampling tick at or after start_tick, e.g., when resuming a run
+        first_sample = math.ceil(start_tick / interval) * interval
+        capacity = max(0, math.ceil((ticks - first_sample) / interval))
+        # The link delivers at most one packet per tick by default, so a run has
+        # at most ticks RTT samples unless the link capacity is larger.
+        if rtt_capacity is None:
+            rtt_capacity = ticks - start_tick
+        self.columns = {
+            name: self.open_column(name, dtype, capacity)
+            for name, dtype in COLUMNS.items()
+        }
+        self.rtt_columns = {
+            name: self.open_column(name, dtype, rtt_capacity)
+            for name, dtype in RTT_COLUMNS.items()
+        }
+        self.next_sample = first_sample
+        self.rows = 0
+        self.rtt_rows = 0
+        self.rtt_dropped = 0
+
+    def open_column(self, name, dtype, capacity):
+        return np.lib.format.open_memmap(
+            os.path.join(self.directory, name + ".npy"),
+            mode="w+",
+            dtype=dtype,
+            shape=(capacity,),
+        )
+
+    def attach(self, simulator):
+        """
+        Start recording simulator: sample it from Simulator.tick() and receive
+        the RTT samples of its host.
+        """
+        simulator.recorder = self
+        simulator.host.rtt_observer = self.record_rtt
+
+    def record_rtt(self, tick, rtt_sample):
+        if self.rtt_rows == len(self.rtt_columns["rtt_tick"]):
+            self.rtt_dropped += 1
+            return
+        self.rtt_columns["rtt_tick"][self.rtt_rows] = tick
+        self.rtt_columns["rtt_sample"][self.rtt_rows] = rtt_sample
+        self.rtt_rows += 1
+
+    def fill(self, until, simulator):
+        """
+        Write a row with the current state of simulator for every sampling tick
+        before until that has no row yet. Simulator.tick() calls this at the
+        start of a tick, for ticks that were skipped by Simulator.run() (and on
+        which the state therefore did not change), and at the end of a tick, for
+        the tick itself.
+        """
+        if self.next_sample >= until:
+            return
+        host = simulator.host
+        timeout_calculator = getattr(host, "timeout_calculator", None)
+        row = (
+            simulator.link.link_queue.qsize(),
+            getattr(host, "window", math.nan),
+            timeout_calculator.timeout if timeout_calculator else math.nan,
+            timeout_calculator.mean_rtt if timeout_calculator else math.nan,
+        )
+        columns = self.columns
+        capacity = len(columns["tick"])
+        while self.next_sample < until and self.rows < capacity:
+            columns["tick"][self.rows] = self.next_sample
+            (
+                columns["queue_depth"][self.rows],
+                columns["window"][self.rows],
+                columns["timeout"][self.rows],
+                columns["mean_rtt"][self.rows],
+            ) = row
+            self.rows += 1
+            self.next_sample += self.interval
+
+    def close(self, ticks, simulator):
+        """
+        Write the rows of any ticks skipped at the end of the run, flush the
+        columns to disk and write meta.json with the number of valid rows.
+        """
+        self.fill(ticks, simulator)
+        for column in list(self.columns.values()) + list(self.rtt_columns.values()):
+            column.flush()
+        meta = {
+            "interval": self.interval,
+            "rows": self.rows,
+            "rtt_rows": self.rtt_rows,
+            "rtt_dropped": self.rtt_dropped,
+        }
+        with open(os.path.join(self.directory, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file)
+
+
+def load_recording(directory):
+    """
+    Memory-map a recording made by Recorder. Returns a dict from column name to
+    a read-only array holding only the valid rows, plus the "meta" dict.
+    """
+    with open(os.path.join(directory, "meta.json")) as meta_file:
+        meta = json.load(meta_file)
+    recording = {"meta": meta}
+    for names, rows in ((COLUMNS, meta["rows"]), (RTT_COLUMNS, meta["rtt_rows"])):
+        for name in names:
+            column = np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+            recording[name] = column[:rows]
+    return recording
@@ -0,0 +1,89 @@
+class ReorderBuffer:
+    """
+    Receiver-side reorder buffer. It remembers the sequence numbers that
+    arrived out of order and advances the in-order point across them as soon
+    as the gap before them is filled, e.g., by a retransmission. Data members
+    of this class are
+
+    **in_order_seq**: Largest sequence number up to which everything has been
+    received
+
+    **buffered**: Number of sequence numbers received beyond in_order_seq
+
+    **received**: Bitmap (a bytearray with one entry per sequence number) of the
+    sequence numbers received, starting at sequence number base
+
+    Each sequence number is set once and passed over once when in_order_seq
+    advances, and the consumed front of the bitmap is dropped once it makes
+    up half of it, so add() is amortized O(1). The bitmap only spans the
+    sequence numbers between in_order_seq and the largest one received, i.e.,
+    at most about a window's worth.
+    """
+
+    # Do not compact the bitmap for fewer consumed entries than this
+    MIN_COMPACT = 1024
+
+    def __init__(self):
+        self.in_order_seq = -1
+        self.buffered = 0
+        self.received = bytearray()
+        self.base = 0
+
+    def add(self, seq_num):
+        """
+        Record the arrival of seq_num.
+
+        Returns:
+
+            False if seq_num had already been received (a duplicate), True
+            otherwise
+        """
+        if seq_num <= self.in_order_seq:
+            return False
+        received = self.received
+        index = seq_num - self.base
+        if index >= len(received):
+            received.extend(bytes(index + 1 - len(received)))
+        elif received[index]:
+            return False
+        received[index] = 1
+        self.buffered += 1
+        if seq_num == self.in_order_seq + 1:
+            self.advance()
+        return True
+
+    def advance(self):
+        # Move in_order_seq past the contiguous run of received sequence numbers
+        received = self.received
+        end = len(received)
+        index = received.find(0, self.in_order_seq + 1 - self.base)
+        if index < 0:
+            index = end
+        self.buffered -= index - (self.in_order_seq + 1 - self.base)
+        self.in_order_seq = self.base + index - 1
+        if index >= self.MIN_COMPACT and 2 * index >= end:
+            del received[:index]
+            self.base += index
+
+    def sack_blocks(self, limit=None):
+        """
+        Return the blocks of sequence numbers received beyond in_order_seq, as
+        a list of (first, last) pairs in increasing order, like the SACK blocks
+        of a TCP receiver. At most limit blocks (the lowest ones) are returned
+        if limit is given.
+        """
+        blocks = []
+        received = self.received
+        index = self.in_order_seq + 1 - self.base
+        end = len(received)
+        while index < end and (limit is None or len(blocks) < limit):
+            # skip the gap, then take the run of received sequence numbers
+            index = received.find(1, index)
+            if index < 0:
+                break
+            last = received.find(0, index)
+            if last < 0:
+                last = end
+            blocks.append((self.base + index, self.base + last - 1))
+            index = last
+        return blocks
@@ -0,0 +1,199 @@
+"""
+On-disk cache of simulation results, shared by the simulator command line,
+sweeps and congestion_collapse.
+
+A run is identified by its configuration: a dict of everything that determines
+its result (host type, window size, rtt_min, loss ratio, queue limit, timeouts,
+seed, ticks, ...), see run_config(). The cache key is the SHA-256 of the
+configuration serialized as canonical JSON (sorted keys) together with the code
+version, a hash of the simulator's source files. Any change to the code
+therefore invalidates every cached result instead of serving stale ones.
+
+Results are small JSON dicts kept in a SQLite database, so several scripts and
+notebooks can use the same cache concurrently. Once the database holds more
+than max_bytes of results, the least recently used ones are evicted.
+
+The location of the cache defaults to $SIMULATOR_CACHE, or
+~/.cache/simulator/results.sqlite.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from timeout_calculator import TimeoutCalculator
+
+DEFAULT_PATH = os.environ.get(
+    "SIMULATOR_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "simulator", "results.sqlite"),
+)
+
+# Default cache size limit, in bytes of configurations and results
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Hash of the source files, computed on first use by code_version()
+_code_version = None
+
+
+def code_version():
+    """
+    Return a hash of every .py file in the simulator's directory.
+    """
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".py"):
+                continue
+            digest.update(name.encode())
+            with open(os.path.join(directory, name), "rb") as source:
+                digest.update(hashlib.sha256(source.read()).digest())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def file_digest(path):
+    """
+    Return the SHA-256 of the contents of path, to identify an input file (such
+    as a loss trace) in a configuration.
+    """
+    with open(path, "rb") as input_file:
+        return hashlib.sha256(input_file.read()).hexdigest()
+
+
+def run_config(
+    host_type,
+    window_size,
+    rtt_min,
+    loss_ratio,
+    queue_limit,
+    seed,
+    ticks,
+    min_timeout=TimeoutCalculator.MIN_TIMEOUT,
+    max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+    **extra
+):
+    """
+    Return the configuration of a run as a dict, with the same keys whether it
+    comes from the command line or from a sweep. extra holds any further
+    parameters that affect the result (e.g., capacity, jitter or precision).
+    """
+    config = {
+        "host_type": host_type,
+        "window_size": window_size,
+        "rtt_min": rtt_min,
+        "loss_ratio": loss_ratio,
+        "queue_limit": queue_limit,
+        "min_timeout": min_timeout,
+        "max_timeout": max_timeout,
+        "seed": seed,
+        "ticks": ticks,
+    }
+    config.update(extra)
+    return config
+
+
+class ResultCache:
+    """
+    SQLite-backed cache from run configuration to result. Data members of this
+    class are
+
+    **path**: Database file
+
+    **max_bytes**: Size above which least recently used results are evicted
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, config TEXT, result TEXT, "
+            "size INTEGER, last_used REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+        )
+        self.connection.commit()
+
+    def key(self, config):
+        """
+        Return the cache key of config for the current code version.
+        """
+        canonical = json.dumps(config, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256((code_version() + canonical).encode()).hexdigest()
+
+    def get(self, config):
+        """
+        Return the cached result of config, or None if there is none.
+        """
+        key = self.key(config)
+        row = self.connection.execute(
+            "SELECT result FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.connection.execute(
+            "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+        )
+        self.connection.commit()
+        return json.loads(row[0])
+
+    def put(self, config, result):
+        """
+        Store result (a JSON-serializable dict) as the result of config, then
+        evict results if the cache is over its size limit.
+        """
+        config_json = json.dumps(config, sort_keys=True)
+        result_json = json.dumps(result)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+            (
+                self.key(config),
+                config_json,
+                result_json,
+                len(config_json) + len(result_json),
+                time.time(),
+            ),
+        )
+        self.connection.commit()
+        self.evict()
+
+    def size(self):
+        # Total size of the cached configurations and results, in bytes
+        return self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+
+    def evict(self):
+        """
+        Delete least recently used results until the cache fits in max_bytes.
+        Returns the number of results deleted.
+        """
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return 0
+        victims = []
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM results ORDER BY last_used"
+        ):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM results WHERE key = ?", victims)
+        self.connection.commit()
+        return len(victims)
+
+    def clear(self):
+        self.connection.execute("DELETE FROM results")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
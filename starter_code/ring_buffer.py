@@ -0,0 +1,111 @@
+from array import array
+
+from packet import PacketPool
+
+
+class PacketRing:
+    """
+    A bounded FIFO of packets for the link queue, implemented as a ring buffer.
+    It is meant as a drop-in replacement for queue.Queue in a single-threaded
+    simulator, so there is no locking.
+
+    Packets are not stored as Python objects. Only the fields that matter once
+    a packet has left the sender are kept, in parallel arrays of machine
+    integers (one slot per queued packet):
+
+    **sent_ts**: Time at which the packet was sent
+
+    **seq_num**: Sequence number of the packet
+
+    **num_retx**: How many times it's been retransmitted so far
+
+    **flow_id**: Which flow the packet belongs to
+
+    A Packet is taken from pool and filled in from these fields when it is
+    dequeued. The arrays start small and double in size as needed, up to limit
+    slots.
+    """
+
+    # number of slots allocated up front
+    INITIAL_SIZE = 1024
+
+    def __init__(self, limit, pool=None):
+        # maximum number of packets that can be queued
+        self.limit = limit
+        # where dequeued packets come from
+        self.pool = pool if pool is not None else PacketPool()
+        size = max(1, min(limit, PacketRing.INITIAL_SIZE))
+        self.sent_ts = array("q", bytes(8 * size))
+        self.seq_num = array("q", bytes(8 * size))
+        self.num_retx = array("q", bytes(8 * size))
+        self.flow_id = array("q", bytes(8 * size))
+        # slot of the packet at the head of the queue
+        self.head = 0
+        # number of packets in the queue
+        self.count = 0
+
+    def qsize(self):
+        return self.count
+
+    def __len__(self):
+        return self.count
+
+    def put(self, pkt):
+        """
+        Append pkt at the tail of the queue. Returns False, and leaves the queue
+        unchanged, if the queue already holds limit packets.
+        """
+        size = len(self.seq_num)
+        if self.count == size:
+            if size >= self.limit:
+                return False
+            self.grow(min(2 * size, self.limit))
+            size = len(self.seq_num)
+        tail = self.head + self.count
+        if tail >= size:
+            tail -= size
+        self.sent_ts[tail] = pkt.sent_ts
+        self.seq_num[tail] = pkt.seq_num
+        self.num_retx[tail] = pkt.num_retx
+        self.flow_id[tail] = pkt.flow_id
+        self.count += 1
+        return True
+
+    def get(self):
+        """
+        Remove the packet at the head of the queue and return it.
+        """
+        assert self.count > 0
+        return self.get_many(1)[0]
+
+    def get_many(self, n):
+        """
+        Remove up to n packets from the head of the queue and return them as a
+        list, oldest first.
+        """
+        n = min(n, self.count)
+        size = len(self.seq_num)
+        pkts = []
+        slot = self.head
+        acquire = self.pool.acquire
+        for _ in range(n):
+            pkt = acquire(self.sent_ts[slot], self.seq_num[slot])
+            pkt.num_retx = self.num_retx[slot]
+            pkt.flow_id = self.flow_id[slot]
+            pkts.append(pkt)
+            slot += 1
+            if slot == size:
+                slot = 0
+        self.head = slot
+        self.count -= n
+        return pkts
+
+    def grow(self, new_size):
+        # Only called when the ring is full. Unroll the ring into new arrays
+        # with the head at slot 0, then pad them up to new_size.
+        for name in ("sent_ts", "seq_num", "num_retx", "flow_id"):
+            old = getattr(self, name)
+            new = old[self.head :] + old[: self.head]
+            new.frombytes(bytes(8 * (new_size - len(old))))
+            setattr(self, name, new)
+        self.head = 0
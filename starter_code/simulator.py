@@ -11,7 +11,11 @@ receiving ACKs for the packet an RTT (i.e., minimum RTT + queuing delay) later.
 
 Similarly, there is no separate packet header format for packets and ACKs. They
 are one and the same. The acknowledgement process works by calling host.recv()
-on the same packet that was sent out as part of a host.send()in the past.
+on a packet with the fields of one sent out as part of a host.send() in the
+past. The link copies those fields into a packet from the simulator's
+PacketPool when it dequeues the packet, and the pdbox releases that copy back to
+the pool right after host.recv() returns, so hosts must not keep references to
+the packets passed to recv() (see PacketPool in packet.py).
 
 The code connects host to link, link to pdbox, and pdbox to host. Hence,
 packets "flow" from host (where the send() method is called to send packets) to
@@ -28,45 +32,83 @@ version of time.
 """
 
 import argparse
-import random
-from network import DelayBox, Link
-from packet import Packet
-from timeout_calculator import TimeoutCalculator
-from stop_and_wait_host import StopAndWaitHost
-from sliding_window_host import SlidingWindowHost
-from aimd_host import AimdHost
+import heapq
 
+import numpy as np
 
-def check_host_type(host_type):
-    # Check that host_type is one of three strings
-    if host_type.lower() not in ["stopandwait", "slidingwindow", "aimd"]:
-        raise argparse.ArgumentTypeError(
-            "Invalid host_type, must be StopAndWait or SlidingWindow or AIMD"
-        )
-    return host_type.lower()
+import event_trace
+from hosts import HOSTS, check_host_type, create_host
+from loss_models import GilbertElliottLoss, TraceLoss, load_loss_trace
+from network import DelayBox, Link
+from packet import Packet, PacketPool
+from result_cache import DEFAULT_PATH, ResultCache, file_digest, run_config
+from timeout_calculator import TimeoutCalculator
 
 
 class Simulator:
+    """
+    Connects host, link and pdbox. All randomness (link losses and pdbox jitter)
+    comes from random number streams derived from seed, one per component, so
+    simulators do not share state with each other or with the random module.
+    If loss_model is given (see loss_models.py), the link uses it instead of
+    Bernoulli losses with loss_ratio, and it is reseeded from seed.
+    """
+
     def __init__(
-        self, host, loss_ratio, queue_limit, rtt_min, seed, verbose=True
+        self,
+        host,
+        loss_ratio,
+        queue_limit,
+        rtt_min,
+        seed,
+        verbose=True,
+        jitter=0,
+        capacity=1,
+        tracer=None,
+        loss_model=None,
     ):
         self.host = host
-        # Initialize the random seed so that it is deterministic
-        random.seed(seed)
+        # Independent random number streams for the link and the pdbox, all
+        # derived from seed so that the simulation is deterministic
+        link_seed, pdbox_seed = np.random.SeedSequence(seed).spawn(2)
+        if loss_model is not None:
+            loss_model.reseed(link_seed)
         # Construct the different elements
 
+        # Packets carried by the network are recycled through this pool:
+        # the link takes them from it and the pdbox returns them after host.recv().
+        # Hosts that recycle their own packets share it.
+        self.packet_pool = PacketPool()
+        if hasattr(host, "packet_pool"):
+            host.packet_pool = self.packet_pool
+
         # The network link connecting sender to the receiver
         # In the simulation, the sender and receiver are really the same object (host),
         # and correspond to the send() and recv() methods
         self.link = Link(
-            loss_ratio=loss_ratio, queue_limit=queue_limit, verbose=verbose
+            loss_ratio=loss_ratio,
+            queue_limit=queue_limit,
+            verbose=verbose,
+            capacity=capacity,
+            pool=self.packet_pool,
+            tracer=event_trace.default_tracer(tracer, verbose),
+            loss_model=loss_model,
+            seed=link_seed,
         )
 
         # Create a box representing the two-way propagation delay
         # , i.e., the minimum round-trip time
         if rtt_min < 2:
             raise argparse.ArgumentTypeError("rtt_min must be at least 2")
-        self.pdbox = DelayBox(rtt_min - 1)
+        # jitter adds a random extra delay on top of that, which may reorder packets
+        self.pdbox = DelayBox(
+            rtt_min - 1, jitter=jitter, pool=self.packet_pool, seed=pdbox_seed
+        )
+
+        # Recorder for per-tick state, if any (see Recorder.attach)
+        self.recorder = None
+        # Per-component profiler, if any (see Profiler.attach)
+        self.profiler = None
 
     def send(self, tick_val):
         # Let the host associated with this link generate a packet
@@ -74,8 +116,22 @@ class Simulator:
 
     def tick(self, tick_val):
         # Run the simulation for the specified number of ticks,
-        # by running the host, then the link, then the pdbox
+        # by running the host, then the link, then the pdbox.
+        # An attached profiler times each of these steps as it ends (lap) and
+        # counts the packets the link and the pdbox pass on
+        profiler = self.profiler
+        pdbox = self.pdbox
+        host = self.host
+        if profiler is not None:
+            pdbox, host = profiler.start(self)
+        if self.recorder is not None:
+            # record the ticks skipped by run(), on which nothing changed
+            self.recorder.fill(tick_val, self)
+            if profiler is not None:
+                profiler.lap("recorder")
         packets = self.send(tick_val)
+        if profiler is not None:
+            profiler.lap("host.send")
         if packets is not None:
             # If a single packet is received, convert it to list
             if type(packets) is Packet:
@@ -83,16 +139,119 @@ class Simulator:
 
             # Transmit the packets received from the host
             for packet in packets:
-                self.link.recv(packet)
+                self.link.recv(packet, tick_val)
+            if profiler is not None:
+                profiler.lap("link.recv", packets)
+
+        self.link.tick(tick_val, pdbox)
+        if profiler is not None:
+            profiler.lap("link.tick")
+        self.pdbox.tick(tick_val, host)
+        if profiler is not None:
+            profiler.lap("pdbox.tick")
+        if self.recorder is not None:
+            self.recorder.fill(tick_val + 1, self)
+            if profiler is not None:
+                profiler.lap("recorder")
+
+    def pending_wakeups(self, tick_val):
+        # Earliest ticks at or after tick_val at which the host, the link and the
+        # pdbox have work to do. Hosts that cannot tell us are woken up every tick.
+        if hasattr(self.host, "next_event_tick"):
+            host_tick = self.host.next_event_tick(tick_val)
+        else:
+            host_tick = tick_val
+        candidates = [
+            host_tick,
+            self.link.next_event_tick(tick_val),
+            self.pdbox.next_event_tick(tick_val),
+        ]
+        return [t for t in candidates if t is not None]
+
+    def run(self, ticks, start_tick=0):
+        """
+        Event-driven equivalent of calling tick() for every tick in
+        range(start_tick, ticks). Pending wakeups of the host, the link and the
+        pdbox are kept in a priority queue and the simulation jumps straight to
+        the earliest one, skipping ticks on which nothing can happen. Skipped
+        ticks are exactly those on which tick() would have been a no-op, so the
+        final state (including the random number stream) is the same as with
+        the per-tick loop. Per-tick events of skipped ticks (such as AimdHost's
+        window trace) are not recorded.
+
+        Args:
+
+            **ticks**: Tick at which to stop (exclusive), as in range()
+
+            **start_tick**: Tick at which to start
+
+        Returns:
+
+            The number of ticks that were actually simulated
+        """
+        # heap of ticks at which some component wants to be woken up.
+        # Stale wakeups (e.g. a timeout for a packet that has since been ACKed)
+        # are harmless: simulating a tick with nothing to do is a no-op.
+        pending = [start_tick]
+        simulated = 0
+        tick_val = start_tick
+        while pending:
+            tick_val = heapq.heappop(pending)
+            if tick_val >= ticks:
+                break
+            self.tick(tick_val)
+            simulated += 1
+            for wakeup in self.pending_wakeups(tick_val + 1):
+                heapq.heappush(pending, wakeup)
+            # Drop wakeups that are already in the past
+            while pending and pending[0] <= tick_val:
+                heapq.heappop(pending)
+        return simulated
+
+    def run_until_steady(self, max_ticks, monitor, start_tick=0, event_driven=False):
+        """
+        Run in windows of monitor.interval ticks until monitor (a
+        SteadyStateMonitor, see steady_state.py) reports that the run has
+        converged, or until max_ticks. The estimate is left in monitor.result.
+
+        Args:
+
+            **max_ticks**: Tick at which to stop if the run does not converge
+
+            **monitor**: SteadyStateMonitor sampling the run after every window
+
+            **start_tick**: Tick at which to start
+
+            **event_driven**: Use run() instead of tick() for every tick
+
+        Returns:
 
-        self.link.tick(tick_val, self.pdbox)
-        self.pdbox.tick(tick_val, self.host)
+            The tick at which the run stopped (exclusive)
+        """
+        monitor.start(self, start_tick)
+        tick_val = start_tick
+        while tick_val < max_ticks:
+            end = min(tick_val + monitor.interval, max_ticks)
+            if event_driven:
+                self.run(end, start_tick=tick_val)
+            else:
+                for tick in range(tick_val, end):
+                    self.tick(tick)
+            if end - tick_val < monitor.interval:
+                # the last window is cut short by max_ticks
+                tick_val = end
+                break
+            tick_val = end
+            monitor.observe(self)
+            if monitor.converged():
+                break
+        return tick_val
 
 
 if __name__ == "__main__":
     # Usage for command line arguments
     parser = argparse.ArgumentParser(
-        description="Assignment 2 simulator. Link capacity is always 1 packet per tick"
+        description="Assignment 2 simulator. Link capacity is 1 packet per tick unless --capacity is given"
     )
     optional = parser._action_groups.pop()
 
@@ -109,7 +268,8 @@ if __name__ == "__main__":
         "--host_type",
         dest="host_type",
         type=check_host_type,
-        choices=["stopandwait", "slidingwindow", "aimd"],
+        help="Protocol the host follows, one of %s or a host type registered by a module in $SIMULATOR_HOST_MODULES"
+        % ", ".join(sorted(HOSTS)),
         required=True,
     )
     required.add_argument(
@@ -161,6 +321,122 @@ if __name__ == "__main__":
         default=TimeoutCalculator.MAX_TIMEOUT,
         help="The minimum timeout value possible for the TimeoutCalculator",
     )
+    optional.add_argument(
+        "--gilbert_elliott",
+        dest="gilbert_elliott",
+        type=float,
+        nargs=2,
+        metavar=("P_GOOD_TO_BAD", "P_BAD_TO_GOOD"),
+        help="Bursty Gilbert-Elliott losses instead of --loss_ratio: per-packet probabilities of entering and leaving the bad state, in which every packet is lost; --loss_ratio applies in the good state",
+    )
+    optional.add_argument(
+        "--loss_trace",
+        dest="loss_trace",
+        help="File of 0s and 1s, one per dequeued packet, 1 meaning lost, replayed instead of --loss_ratio",
+    )
+    optional.add_argument(
+        "--capacity",
+        dest="capacity",
+        type=int,
+        default=1,
+        help="Link capacity in packets per tick, default 1",
+    )
+    optional.add_argument(
+        "--jitter",
+        dest="jitter",
+        type=int,
+        default=0,
+        help="Max. extra propagation delay in ticks, drawn uniformly per packet, default 0",
+    )
+    optional.add_argument(
+        "--verbose",
+        dest="verbose",
+        action="store_true",
+        help="Print every event (packets sent, received, retransmitted, dropped)",
+    )
+    optional.add_argument(
+        "--trace",
+        dest="trace",
+        help="Binary file to record every event to, see event_trace.load_trace",
+    )
+    optional.add_argument(
+        "--record",
+        dest="record",
+        help="Directory to record queue depth, window, timeout and RTT samples to",
+    )
+    optional.add_argument(
+        "--record_interval",
+        dest="record_interval",
+        type=int,
+        default=1,
+        help="Record the state every this many ticks, default 1",
+    )
+    optional.add_argument(
+        "--stats",
+        dest="stats",
+        action="store_true",
+        help="Report RTT mean, variance and percentiles and windowed goodput",
+    )
+    optional.add_argument(
+        "--goodput_interval",
+        dest="goodput_interval",
+        type=int,
+        default=1000,
+        help="Window in ticks over which --stats measures goodput, default 1000",
+    )
+    optional.add_argument(
+        "--precision",
+        dest="precision",
+        type=float,
+        help="Stop as soon as the run is in steady state and the 95%% confidence interval of its goodput is within this fraction of the estimate (e.g. 0.01); --ticks becomes the maximum",
+    )
+    optional.add_argument(
+        "--steady_interval",
+        dest="steady_interval",
+        type=int,
+        default=1000,
+        help="Window in ticks over which --precision samples goodput and queue length, default 1000",
+    )
+    optional.add_argument(
+        "--pacing_gain",
+        dest="pacing_gain",
+        type=float,
+        help="Pace new packets at this multiple of window / smoothed RTT instead of sending the free window at once (slidingwindow and aimd only, e.g. 1.25)",
+    )
+    optional.add_argument(
+        "--checkpoint",
+        dest="checkpoint",
+        help="File to save a checkpoint of the simulation to when it ends",
+    )
+    optional.add_argument(
+        "--cache",
+        dest="cache",
+        default=DEFAULT_PATH,
+        help="SQLite file caching the results of runs, default %s" % DEFAULT_PATH,
+    )
+    optional.add_argument(
+        "--no_cache",
+        dest="no_cache",
+        action="store_true",
+        help="Always simulate, neither reading nor writing the result cache",
+    )
+    optional.add_argument(
+        "--resume",
+        dest="resume",
+        help="Checkpoint file to continue from, up to --ticks; the other simulation parameters are taken from the checkpoint",
+    )
+    optional.add_argument(
+        "--event_driven",
+        dest="event_driven",
+        action="store_true",
+        help="Skip ticks on which nothing can happen instead of stepping every tick",
+    )
+    optional.add_argument(
+        "--profile",
+        dest="profile",
+        action="store_true",
+        help="Report the time spent in the host, link and pdbox, and packet counts",
+    )
     parser._action_groups.append(optional)
 
     # Actually carry out parsing
@@ -168,36 +444,163 @@ if __name__ == "__main__":
     for arg in vars(args):
         print("%s: %s" % (arg, getattr(args, arg)))
 
-    # Create the host based on the host_type, i.e., what protocol the host follows
-    if args.host_type == "stopandwait":
-        host = StopAndWaitHost(
-            min_timeout=args.min_timeout, max_timeout=args.max_timeout
-        )
-    elif args.host_type == "slidingwindow":
-        if args.window_size is None:
-            raise argparse.ArgumentTypeError(
-                "window_size must be defined for host_type SlidingWindow"
-            )
-        host = SlidingWindowHost(
-            args.window_size,
-            min_timeout=args.min_timeout,
-            max_timeout=args.max_timeout,
-        )
-    elif args.host_type == "aimd":
-        host = AimdHost(
-            min_timeout=args.min_timeout, max_timeout=args.max_timeout
-        )
+    # One tracer for all components. When neither --verbose nor --trace is
+    # given, tracing is disabled and costs one attribute check per event.
+    if args.verbose or args.trace is not None:
+        tracer = event_trace.Tracer(path=args.trace, echo=args.verbose)
     else:
-        assert False
+        tracer = event_trace.NULL_TRACER
 
-    simulator = Simulator(
-        host, args.loss_ratio, args.queue_limit, args.rtt_min, args.seed
+    # Runs whose only output is the final report are looked up in the result
+    # cache first, unless --no_cache is given
+    cache = None
+    result = None
+    cacheable = not (
+        args.verbose
+        or args.trace is not None
+        or args.record is not None
+        or args.stats
+        or args.profile
+        or args.checkpoint is not None
+        or args.resume is not None
     )
-    for tick in range(0, args.ticks):
-        simulator.tick(tick)
+    if cacheable and not args.no_cache:
+        cache = ResultCache(args.cache)
+        config = run_config(
+            args.host_type,
+            args.window_size,
+            args.rtt_min,
+            args.loss_ratio,
+            args.queue_limit,
+            args.seed,
+            args.ticks,
+            args.min_timeout,
+            args.max_timeout,
+            capacity=args.capacity,
+            jitter=args.jitter,
+            gilbert_elliott=args.gilbert_elliott,
+            loss_trace=None if args.loss_trace is None else file_digest(args.loss_trace),
+            precision=args.precision,
+            steady_interval=args.steady_interval,
+            pacing_gain=args.pacing_gain,
+        )
+        result = cache.get(config)
+        if result is not None:
+            print("Result from cache %s" % cache.path)
+
+    if result is None:
+        if args.resume is not None:
+            # Continue a checkpointed run; its parameters come from the checkpoint
+            import checkpoint
+
+            simulator, start_tick = checkpoint.load(args.resume)
+        else:
+            # Create the host based on the host_type, i.e., what protocol the host follows
+            options = {}
+            if args.pacing_gain is not None:
+                options["pacing_gain"] = args.pacing_gain
+            host = create_host(
+                args.host_type,
+                args.window_size,
+                args.min_timeout,
+                args.max_timeout,
+                tracer=tracer,
+                **options
+            )
+
+            loss_model = None
+            if args.gilbert_elliott is not None:
+                loss_model = GilbertElliottLoss(
+                    args.gilbert_elliott[0],
+                    args.gilbert_elliott[1],
+                    loss_good=args.loss_ratio,
+                )
+            elif args.loss_trace is not None:
+                loss_model = TraceLoss(load_loss_trace(args.loss_trace))
+
+            simulator = Simulator(
+                host,
+                args.loss_ratio,
+                args.queue_limit,
+                args.rtt_min,
+                args.seed,
+                jitter=args.jitter,
+                capacity=args.capacity,
+                tracer=tracer,
+                loss_model=loss_model,
+            )
+            start_tick = 0
+        if args.record is not None:
+            # imported here so that NumPy is only needed when recording
+            from recorder import Recorder
+
+            recorder = Recorder(
+                args.record,
+                args.ticks,
+                args.record_interval,
+                rtt_capacity=(args.ticks - start_tick) * simulator.link.capacity,
+                start_tick=start_tick,
+            )
+            recorder.attach(simulator)
+        if args.stats:
+            from streaming_stats import RunStats
+
+            stats = RunStats(args.goodput_interval)
+            stats.attach(simulator.host, start_tick)
+        if args.profile:
+            from profiler import Profiler
+
+            profiler = Profiler()
+            profiler.attach(simulator)
+        end_tick = args.ticks
+        if args.precision is not None:
+            from steady_state import SteadyStateMonitor
+
+            monitor = SteadyStateMonitor(args.steady_interval, args.precision)
+            end_tick = simulator.run_until_steady(
+                args.ticks, monitor, start_tick=start_tick, event_driven=args.event_driven
+            )
+        elif args.event_driven:
+            simulator.run(args.ticks, start_tick=start_tick)
+        else:
+            for tick in range(start_tick, args.ticks):
+                simulator.tick(tick)
+        tracer.close()
+        if args.stats:
+            stats.finish(end_tick)
+            for name, value in stats.summary().items():
+                print("%s: %s" % (name, value))
+        if args.profile:
+            print(profiler.report())
+            simulator.profiler = None
+        if args.record is not None:
+            recorder.close(end_tick, simulator)
+        if args.checkpoint is not None:
+            import checkpoint
+
+            checkpoint.save(simulator, max(start_tick, end_tick), args.checkpoint)
+
+        result = {
+            "in_order_rx_seq": simulator.host.in_order_rx_seq,
+            "ticks_used": end_tick - start_tick,
+            "steady_state": None,
+        }
+        if args.precision is not None:
+            result["steady_state"] = (
+                monitor.result if monitor.result is not None else monitor.estimate()
+            )
+        if cache is not None:
+            cache.put(config, result)
+    if cache is not None:
+        cache.close()
+
+    if result["steady_state"] is not None:
+        print("ticks_needed: %d" % result["ticks_used"])
+        for name, value in result["steady_state"].items():
+            print("%s: %s" % (name, value))
 
     # Report the largest sequence number that has been received in order
     print(
         "Maximum in order received sequence number "
-        + str(simulator.host.in_order_rx_seq)
+        + str(result["in_order_rx_seq"])
     )
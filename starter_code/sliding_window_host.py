@@ -1,11 +1,21 @@
-from packet import Packet
+import math
+
+import event_trace
+from pacing import Pacer
+from packet import PacketPool
+from reorder_buffer import ReorderBuffer
 from timeout_calculator import TimeoutCalculator
+from unacked_table import UnackedTable
 
 
 class SlidingWindowHost:
     """
     This host follows the SlidingWindow protocol. It maintains a window size and the
-    list of unacked packets. The algorithm itself is documented with the send method
+    list of unacked packets. The algorithm itself is documented with the send method.
+    With a pacing_gain, new packets are paced over the smoothed RTT (see pacing.py)
+    instead of filling the window at once. New packets are taken from packet_pool
+    and given back to it once acked; a retransmission resends the unacked packet
+    itself.
     """
 
     def __init__(
@@ -14,21 +24,37 @@ class SlidingWindowHost:
         verbose=True,
         min_timeout=TimeoutCalculator.MIN_TIMEOUT,
         max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+        tracer=None,
+        pacing_gain=None,
     ):
-        # list of unacked packets
-        self.unacked = []
+        # unacked packets, indexed by seq_num and by timeout_tick
+        self.unacked = UnackedTable()
         # window size
         self.window = window_size
         # maximum sequence number sent so far
         self.max_seq = -1
         # maximum sequence number received so far in order
         self.in_order_rx_seq = -1
+        # packets received out of order, with SACK-style blocks of them
+        self.reorder_buffer = ReorderBuffer()
+        # Where new packets come from and acked ones go back to; the Simulator
+        # replaces it with its own
+        self.packet_pool = PacketPool()
+        # Spreads new packets over the smoothed RTT, if pacing_gain is given
+        self.pacer = None if pacing_gain is None else Pacer(pacing_gain)
+        # Whether to print output
+        self.verbose = verbose
+        # Where to record events; echoes them as text if verbose
+        self.tracer = event_trace.default_tracer(tracer, verbose)
+        # Called as rtt_observer(tick, rtt_sample) at the end of recv(), if set
+        self.rtt_observer = None
         # object for computing timeouts
         self.timeout_calculator = TimeoutCalculator(
-            verbose=verbose, min_timeout=min_timeout, max_timeout=max_timeout
+            verbose=verbose,
+            min_timeout=min_timeout,
+            max_timeout=max_timeout,
+            tracer=self.tracer,
         )
-        # Whether to print output
-        self.verbose = verbose
 
     def send(self, tick):
         """
@@ -50,77 +76,57 @@ class SlidingWindowHost:
         
 
         # First, process retransmissions
-        for i, unacked_pkt in enumerate(self.unacked):
-            unacked_pkt = self.unacked[i]
-            if tick >= unacked_pkt.timeout_tick:
-                if self.verbose:
-                    print(
-                        "@ "
-                        + str(tick)
-                        + " timeout for unacked_pkt "
-                        + str(unacked_pkt.seq_num)
-                        + " timeout duration was "
-                        + str(unacked_pkt.timeout_duration)
-                    )
-                # TODO: Retransmit any packet that has timed out
-                # by doing the following in order
-                #CHECKKK
-                # (1) Creating a new packet
-                #retx_pkt = Packet(tick , self.max_seq +1)
-                retx_pkt = Packet(tick , unacked_pkt.seq_num)
-                # (2) Incrementing num_retx (for debugging purposes)
-                retx_pkt.num_retx +=1
-                
-                # (3) Append the packet to the list of packets created earlier
-                pkts.append(retx_pkt)
-                # (4) Backing off the timer
-                self.timeout_calculator.exp_backoff()
-                # (5) Updating timeout_tick and timeout_duration appropriately after backing off the timer
-                #pls check wassup
-                
-                retx_pkt.timeout_duration = tick - unacked_pkt.timeout_tick #not sure at all
-                retx_pkt.timeout_tick=  tick + retx_pkt.timeout_duration
-
-                if self.verbose:
-                    print(
-                        "retx packet @ "
-                        + str(tick)
-                        + " with sequence number "
-                        + str(retx_pkt.seq_num)
-                    )
-                if self.verbose:
-                    print(
-                        "@ "
-                        + str(tick)
-                        + " exp backoff for packet "
-                        + str(unacked_pkt.seq_num)
-                    )
-            self.unacked[i] = unacked_pkt
+        for unacked_pkt in self.unacked.pop_expired(tick):
+            if self.tracer.enabled:
+                self.tracer.record(
+                    event_trace.TIMEOUT,
+                    tick,
+                    unacked_pkt.seq_num,
+                    unacked_pkt.timeout_duration,
+                )
+            # TODO: Retransmit any packet that has timed out
+            # by doing the following in order
+            # (1) Resending the unacked packet itself; the link only copies its
+            # fields, so no new packet is needed
+            unacked_pkt.sent_ts = tick
+            # (2) Incrementing num_retx (for debugging purposes)
+            unacked_pkt.num_retx += 1
+            # (3) Append the packet to the list of packets created earlier
+            pkts.append(unacked_pkt)
+            # (4) Backing off the timer
+            self.timeout_calculator.exp_backoff(tick)
+            # (5) Updating timeout_tick and timeout_duration appropriately after backing off the timer
+            unacked_pkt.timeout_duration = self.timeout_calculator.timeout
+            self.unacked.reschedule(unacked_pkt, tick + unacked_pkt.timeout_duration)
+
+            if self.tracer.enabled:
+                self.tracer.record(event_trace.RETX, tick, unacked_pkt.seq_num)
+            if self.tracer.enabled:
+                self.tracer.record(event_trace.BACKOFF, tick, unacked_pkt.seq_num)
 
         assert len(self.unacked) <= self.window
 
-        # Now fill up the window with new packets
+        # Now fill up the window with new packets, as far as pacing allows
         while len(self.unacked) < self.window:
+            if self.pacer is not None and not self.pacer.allow(tick):
+                break
             # TODO: Create new packets, set their retransmission timeout, and add them to the list
             #BIG CHECK
-            pkt = Packet(tick , self.max_seq +1)
+            pkt = self.packet_pool.acquire(tick, self.max_seq + 1)
+            pkt.timeout_duration = self.timeout_calculator.timeout
             pkt.timeout_tick = self.timeout_calculator.timeout + tick
-            #pkt.timeout_duration = tick - pkt.timeout_tick #not sure at all
             pkts.append(pkt)
 
             #what to set their retransmission timeout as?
             # TODO: Remember to update self.max_seq and add the just sent packet to self.unacked
             self.max_seq = pkt.seq_num
-            self.unacked.append(pkt)
-            if self.verbose:
-                print(
-                    "sent packet @ "
-                    + str(tick)
-                    + " with sequence number "
-                    + str(pkt.seq_num)
-                )
-        # window must be filled up at this point
-        assert len(self.unacked) == self.window
+            self.unacked.add(pkt)
+            if self.pacer is not None:
+                self.pacer.sent(tick, self.window, self.timeout_calculator)
+            if self.tracer.enabled:
+                self.tracer.record(event_trace.SEND, tick, pkt.seq_num)
+        # window must be filled up at this point, unless pacing holds packets back
+        assert self.pacer is not None or len(self.unacked) == self.window
 
         # TODO: return the list of packets that need to be transmitted on to
         # the network
@@ -144,23 +150,48 @@ class SlidingWindowHost:
         # TODO: Update timeout
         self.timeout_calculator.update_timeout(rtt_sample)
 
-        # TODO: Remove received packet from self.unacked
-        for i_pkt in self.unacked:
-            if i_pkt.seq_num == pkt.seq_num or i_pkt.seq_num == self.in_order_rx_seq + 1:
-                self.unacked.remove(i_pkt)
+        # Remove the received packet from self.unacked and recycle it
+        acked_pkt = self.unacked.remove(pkt.seq_num)
+        if acked_pkt is not None:
+            self.packet_pool.release(acked_pkt)
 
         # TODO: Update in_order_rx_seq to reflect the largest sequence number that you
-        # have received in order so far
-        if (pkt.seq_num == self.in_order_rx_seq+1):
-            self.in_order_rx_seq = self.in_order_rx_seq +1
-        
-            
+        # have received in order so far. Packets that arrived out of order
+        # before a retransmission count as soon as the gap is filled.
+        self.reorder_buffer.add(pkt.seq_num)
+        self.in_order_rx_seq = self.reorder_buffer.in_order_seq
 
         assert len(self.unacked) <= self.window
-        if self.verbose:
-            print(
-                "rx packet @ "
-                + str(tick)
-                + " with sequence number "
-                + str(pkt.seq_num)
-            )
+        if self.tracer.enabled:
+            self.tracer.record(event_trace.RECV, tick, pkt.seq_num)
+
+        if self.rtt_observer is not None:
+            self.rtt_observer(tick, rtt_sample)
+
+    def next_event_tick(self, tick):
+        """
+        Earliest tick at or after tick at which send() could transmit a packet,
+        assuming no packet is received in the meantime. That is either when the
+        window has room for new packets (now, or when pacing allows the next
+        one), or when the first unacked packet times out.
+
+        Args:
+
+            **tick**: Simulated time
+
+        Returns:
+
+            The tick at which the host next needs to be woken up, or None if
+            there is nothing outstanding
+        """
+        wakeup = None
+        if len(self.unacked) < self.window:
+            if self.pacer is None:
+                return tick
+            wakeup = self.pacer.next_event_tick(tick)
+        first_timeout = self.unacked.next_timeout()
+        if first_timeout is not None:
+            timeout_tick = max(tick, math.ceil(first_timeout))
+            if wakeup is None or timeout_tick < wakeup:
+                wakeup = timeout_tick
+        return wakeup
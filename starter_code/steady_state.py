@@ -0,0 +1,182 @@
+"""
+Steady-state detection, to stop a simulation once its throughput is known
+precisely enough instead of running for a fixed number of ticks.
+
+A SteadyStateMonitor samples the simulator at the end of every window of
+interval ticks:
+
+**goodput**: Packets received in order during the window, per tick
+
+**queue**: Link queue occupancy at the end of the window
+
+The warm-up period is found with MSER (the marginal standard error rule of
+White): the truncation point d minimizes the standard error of the mean of the
+windows after d. It is computed for both series and the later of the two is
+used. If it lies in the second half of the windows seen so far, the series is
+still drifting (e.g., the queue keeps growing) and the run is not yet in steady
+state.
+
+After the warm-up, the goodput windows are grouped into BATCHES batch means,
+which are close to independent even though consecutive windows are not. Their
+Student t confidence interval gives the precision of the throughput estimate,
+and the run is converged once the half-width of the interval is at most
+precision times the estimate.
+"""
+
+import numpy as np
+
+# Number of batch means the confidence interval is computed from
+BATCHES = 10
+
+# 97.5% quantile of Student's t distribution with BATCHES - 1 degrees of
+# freedom, for a two-sided 95% confidence interval
+T_QUANTILE = 2.262
+
+# Relative difference, to the mean square of the series, below which MSER
+# values count as equal
+MSER_EPSILON = 1e-9
+
+
+def mser_truncation(series):
+    """
+    Return the MSER truncation point of series: the number of leading values
+    to discard as warm-up, which minimizes
+    sum((x_i - mean)^2 for the values after d) / (n - d)^2. At least BATCHES
+    values are always kept. Minima within MSER_EPSILON times the mean square
+    of series count as ties, which go to the smallest d, so that rounding
+    errors do not pick the truncation point of a flat series.
+    """
+    values = np.asarray(series, dtype=np.float64)
+    n = len(values)
+    if n <= BATCHES:
+        return 0
+    scale = float(np.mean(values**2))
+    # Centering keeps the sums below small, so that their difference does not
+    # cancel out into rounding errors
+    values = values - values.mean()
+    # sums and sums of squares of values[d:] for every d, from cumulative sums
+    # of the reversed series
+    tail_sum = np.cumsum(values[::-1])[::-1]
+    tail_square = np.cumsum(values[::-1] ** 2)[::-1]
+    kept = np.arange(n, 0, -1, dtype=np.float64)
+    squared_error = np.maximum(tail_square - tail_sum * tail_sum / kept, 0.0)
+    mser = squared_error[: n - BATCHES + 1] / kept[: n - BATCHES + 1] ** 2
+    return int(np.flatnonzero(mser <= mser.min() + MSER_EPSILON * scale)[0])
+
+
+def batch_means(series):
+    """
+    Return the mean of series and the half-width of its 95% confidence
+    interval, from BATCHES batch means. Leading values that do not fill a
+    batch are dropped.
+    """
+    values = np.asarray(series, dtype=np.float64)
+    size = len(values) // BATCHES
+    if size == 0:
+        raise ValueError("Need at least %d values for batch means" % BATCHES)
+    batches = values[len(values) - size * BATCHES :].reshape(BATCHES, size).mean(axis=1)
+    half_width = T_QUANTILE * batches.std(ddof=1) / np.sqrt(BATCHES)
+    return float(batches.mean()), float(half_width)
+
+
+class SteadyStateMonitor:
+    """
+    Decides when a simulation has reached steady state and its throughput is
+    known to within precision (relative half-width of a 95% confidence
+    interval), see the module docstring. Data members of this class are
+
+    **goodput**: Goodput of every window so far
+
+    **queue**: Queue occupancy at the end of every window so far
+
+    **result**: The estimate once converged() has returned True, or after
+    the last window otherwise, as returned by estimate()
+
+    Windows are interval ticks long; at least min_windows are needed after the
+    warm-up before the run may stop.
+    """
+
+    def __init__(self, interval=1000, precision=0.05, min_windows=2 * BATCHES):
+        if min_windows < BATCHES:
+            raise ValueError("min_windows must be at least %d" % BATCHES)
+        self.interval = interval
+        self.precision = precision
+        self.min_windows = min_windows
+        self.goodput = []
+        self.queue = []
+        self.result = None
+        # tick at which the first window starts and in_order_rx_seq at the end
+        # of the last window
+        self.start_tick = 0
+        self.last_seq = -1
+
+    def start(self, simulator, start_tick=0):
+        """
+        Start monitoring simulator, whose run continues at start_tick.
+        """
+        self.start_tick = start_tick
+        self.last_seq = simulator.host.in_order_rx_seq
+
+    def observe(self, simulator):
+        """
+        Sample simulator at the end of a window.
+        """
+        seq = simulator.host.in_order_rx_seq
+        self.goodput.append((seq - self.last_seq) / self.interval)
+        self.last_seq = seq
+        self.queue.append(simulator.link.link_queue.qsize())
+
+    def estimate(self):
+        """
+        Return the current estimate as a dict with whether the run is converged,
+        the number of ticks monitored, the warm-up in ticks, the mean goodput
+        after the warm-up with the half-width of its confidence interval, and
+        the mean queue occupancy after the warm-up. Goodput and queue are NaN
+        if there are too few windows after the warm-up.
+        """
+        windows = len(self.goodput)
+        warmup = max(mser_truncation(self.goodput), mser_truncation(self.queue))
+        result = {
+            "converged": False,
+            "ticks": windows * self.interval,
+            "warmup_ticks": warmup * self.interval,
+            "goodput": float("nan"),
+            "goodput_half_width": float("nan"),
+            "queue": float("nan"),
+        }
+        if windows - warmup < BATCHES:
+            return result
+        goodput, half_width = batch_means(self.goodput[warmup:])
+        result["goodput"] = goodput
+        result["goodput_half_width"] = half_width
+        result["queue"] = float(np.mean(self.queue[warmup:]))
+        result["converged"] = (
+            warmup <= windows // 2
+            and windows - warmup >= self.min_windows
+            and half_width <= self.precision * goodput
+        )
+        return result
+
+    def converged(self):
+        """
+        Return True once the run is in steady state and the goodput estimate is
+        precise enough. Called after every observe().
+        """
+        self.result = self.estimate()
+        return self.result["converged"]
+
+
+def check(lengths=range(1, 400), value=0.1):
+    """
+    Regression check of mser_truncation(): a constant series of every length
+    in lengths has no warm-up. Returns the lengths for which it finds one.
+    """
+    return [n for n in lengths if mser_truncation(np.full(n, value)) != 0]
+
+
+if __name__ == "__main__":
+    mismatches = check()
+    if mismatches:
+        print("Constant series with a warm-up: lengths %s" % mismatches)
+    else:
+        print("No warm-up found in constant series")
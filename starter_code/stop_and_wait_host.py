@@ -1,3 +1,6 @@
+import math
+
+import event_trace
 from packet import Packet
 from timeout_calculator import TimeoutCalculator
 
@@ -13,6 +16,7 @@ class StopAndWaitHost:
         verbose=True,
         min_timeout=TimeoutCalculator.MIN_TIMEOUT,
         max_timeout=TimeoutCalculator.MAX_TIMEOUT,
+        tracer=None,
     ):
         # maximum sequence number received so far in order
         self.in_order_rx_seq = -1
@@ -20,12 +24,19 @@ class StopAndWaitHost:
         self.ready_to_send = True
         # when was this packet sent out last?
         self.packet_sent_time = -1
+        # Whether to print output
+        self.verbose = verbose
+        # Where to record events; echoes them as text if verbose
+        self.tracer = event_trace.default_tracer(tracer, verbose)
+        # Called as rtt_observer(tick, rtt_sample) at the end of recv(), if set
+        self.rtt_observer = None
         # initialize TimeoutCalculator
         self.timeout_calculator = TimeoutCalculator(
-            verbose=verbose, min_timeout=min_timeout, max_timeout=max_timeout
+            verbose=verbose,
+            min_timeout=min_timeout,
+            max_timeout=max_timeout,
+            tracer=self.tracer,
         )
-        # Whether to print output
-        self.verbose = verbose
 
     def send(self, tick):
         """
@@ -41,13 +52,8 @@ class StopAndWaitHost:
             self.ready_to_send = False
 
             # TODO: Return the packet
-            if self.verbose:
-                print(
-                    "sent packet @ "
-                    + str(tick)
-                    + " with sequence number "
-                    + str(pkt.seq_num)
-                )
+            if self.tracer.enabled:
+                self.tracer.record(event_trace.SEND, tick, pkt.seq_num)
             return pkt
         elif tick - self.packet_sent_time >= self.timeout_calculator.timeout:
             pass
@@ -61,19 +67,14 @@ class StopAndWaitHost:
             
             # TODO: Exponentially back off the timer
             
-            self.timeout_calculator.exp_backoff()
+            self.timeout_calculator.exp_backoff(tick)
 
             # TODO: Increment num_retx field on packet to detect retransmissions for debugging
             pkt.num_retx +=1
             # TODO: Return the packet
             # return pkt
-            if self.verbose:
-                print(
-                    "retx packet @ "
-                    + str(tick)
-                    + " with sequence number "
-                    + str(pkt.seq_num)
-                )
+            if self.tracer.enabled:
+                self.tracer.record(event_trace.RETX, tick, pkt.seq_num)
             return pkt
         # If we do not time out and are not ready to send, do nothing.
         #check we have to do somethign here?
@@ -90,13 +91,8 @@ class StopAndWaitHost:
         """
         assert tick > pkt.sent_ts
         pass
-        if self.verbose:
-            print(
-                "@ "
-                + str(tick)
-                + " timeout computed to be "
-                + str(self.timeout_calculator.timeout)
-            )
+        if self.tracer.enabled:
+            self.tracer.record(event_trace.RTO, tick, value=self.timeout_calculator.timeout)
         # TODO: Compute RTT sample
         #check 
         rtt_sample = tick - pkt.sent_ts
@@ -118,10 +114,26 @@ class StopAndWaitHost:
         # TODO: Only print this when you received the packet
         if pkt.seq_num == (self.in_order_rx_seq+1):
 
-            if self.verbose:
-                print(
-                    "rx packet @ "
-                    + str(tick)
-                    + " with sequence number "
-                    + str(pkt.seq_num)
-                )
+            if self.tracer.enabled:
+                self.tracer.record(event_trace.RECV, tick, pkt.seq_num)
+
+        if self.rtt_observer is not None:
+            self.rtt_observer(tick, rtt_sample)
+
+    def next_event_tick(self, tick):
+        """
+        Earliest tick at or after tick at which send() could transmit a packet,
+        assuming no packet is received in the meantime.
+
+        Args:
+
+            **tick**: Simulated time
+
+        Returns:
+
+            The tick at which the host next needs to be woken up
+        """
+        if self.ready_to_send:
+            return tick
+        # send() retransmits once tick - packet_sent_time >= timeout
+        return max(tick, self.packet_sent_time + math.ceil(self.timeout_calculator.timeout))
@@ -0,0 +1,282 @@
+"""
+Online statistics of a run, in bounded memory.
+
+RunStats is fed from a host's recv() path (through its rtt_observer hook) and
+keeps:
+
+**rtt**: Mean and variance of the RTT samples (Welford)
+
+**rtt_quantiles**: A DDSketch of the RTT samples, for percentiles such as p50,
+p99 and p99.9 with a bounded relative error
+
+**goodput**: Goodput (packets received in order per tick) over consecutive
+windows of interval ticks
+
+Memory does not grow with the length of the run. All estimators have a
+merge() method, so statistics of parallel runs (e.g., the points of a sweep or
+the flows of a MultiFlowHost) can be combined into one.
+"""
+
+import collections
+import math
+
+
+class Welford:
+    """
+    Running count, mean and variance of a stream of values, using Welford's
+    algorithm. Data members of this class are
+
+    **count**: Number of values seen
+
+    **mean**: Mean of the values
+
+    **m2**: Sum of squared differences from the mean
+
+    **min**, **max**: Smallest and largest value
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        Add the values seen by other, as if they had been added to self
+        (Chan et al.'s parallel update).
+        """
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        # Sample variance, 0 for fewer than two values
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class QuantileSketch:
+    """
+    DDSketch of a stream of non-negative values. Positive values are counted in
+    logarithmic buckets: bucket i holds values in (gamma^(i-1), gamma^i], with
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy), so every
+    quantile is returned within relative_accuracy of a true value. Data
+    members of this class are
+
+    **buckets**: Dict from bucket index to count
+
+    **zero_count**: Number of values that are 0 (or less)
+
+    **count**: Number of values seen
+
+    At most max_buckets buckets are kept. Beyond that, the lowest buckets are
+    merged, which only affects the accuracy of the lowest quantiles. Sketches
+    with the same relative_accuracy are merged by adding their counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def collapse(self):
+        # Merge the lowest buckets until at most max_buckets are left
+        indices = sorted(self.buckets)
+        excess = len(indices) - self.max_buckets
+        merged = sum(self.buckets.pop(index) for index in indices[:excess])
+        self.buckets[indices[excess]] += merged
+
+    def merge(self, other):
+        """
+        Add the values seen by other, which must have the same relative_accuracy.
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def quantile(self, q):
+        """
+        Return an estimate of the q-quantile (0 <= q <= 1), or NaN if no values
+        have been seen.
+        """
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # middle of the bucket, in relative terms
+                estimate = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+
+class GoodputMeter:
+    """
+    Goodput over consecutive windows of interval ticks, starting at tick 0.
+    Goodput is the number of packets received in order, i.e., the increase of
+    in_order_rx_seq, per tick. Data members of this class are
+
+    **rates**: Welford statistics of the goodput of every completed window
+
+    **recent**: Goodput of the last history completed windows
+
+    **total**: Number of packets received in order so far
+
+    Merging two meters merges their rates and totals. recent keeps only the
+    windows of self.
+    """
+
+    def __init__(self, interval=1000, history=64):
+        self.interval = interval
+        self.rates = Welford()
+        self.recent = collections.deque(maxlen=history)
+        self.total = 0
+        # first tick of the current window and packets received in it
+        self.window_start = 0
+        self.window_packets = 0
+        # in_order_rx_seq at the last update
+        self.last_seq = -1
+
+    def advance(self, tick):
+        # Close every window that ended at or before tick
+        while tick >= self.window_start + self.interval:
+            rate = self.window_packets / self.interval
+            self.rates.add(rate)
+            self.recent.append(rate)
+            self.window_start += self.interval
+            self.window_packets = 0
+
+    def update(self, tick, in_order_rx_seq):
+        """
+        Account for in_order_rx_seq having been reached at tick.
+        """
+        self.advance(tick)
+        received = in_order_rx_seq - self.last_seq
+        self.window_packets += received
+        self.total += received
+        self.last_seq = in_order_rx_seq
+
+    def merge(self, other):
+        self.rates.merge(other.rates)
+        self.total += other.total
+
+
+class RunStats:
+    """
+    RTT and goodput statistics of a host, fed from its rtt_observer hook, see
+    attach(). The observer that was already set on the host (e.g., a Recorder)
+    keeps being called.
+    """
+
+    def __init__(self, interval=1000, relative_accuracy=0.01):
+        self.rtt = Welford()
+        self.rtt_quantiles = QuantileSketch(relative_accuracy)
+        self.goodput = GoodputMeter(interval)
+        self.host = None
+        self.chained = None
+
+    def attach(self, host, start_tick=0):
+        """
+        Start collecting statistics from host, whose run continues at
+        start_tick (e.g., after resuming from a checkpoint).
+        """
+        self.host = host
+        self.chained = host.rtt_observer
+        host.rtt_observer = self.observe
+        self.goodput.window_start = start_tick
+        self.goodput.last_seq = host.in_order_rx_seq
+
+    def observe(self, tick, rtt_sample):
+        self.rtt.add(rtt_sample)
+        self.rtt_quantiles.add(rtt_sample)
+        self.goodput.update(tick, self.host.in_order_rx_seq)
+        if self.chained is not None:
+            self.chained(tick, rtt_sample)
+
+    def finish(self, ticks):
+        """
+        Close the goodput windows that ended by ticks, the end of the run.
+        """
+        self.goodput.advance(ticks)
+
+    def merge(self, other):
+        self.rtt.merge(other.rtt)
+        self.rtt_quantiles.merge(other.rtt_quantiles)
+        self.goodput.merge(other.goodput)
+
+    def summary(self):
+        """
+        Return the statistics as a dict of numbers.
+        """
+        rates = self.goodput.rates
+        return {
+            "rtt_count": self.rtt.count,
+            "rtt_mean": self.rtt.mean,
+            "rtt_std": self.rtt.std,
+            "rtt_min": self.rtt.min,
+            "rtt_p50": self.rtt_quantiles.quantile(0.5),
+            "rtt_p99": self.rtt_quantiles.quantile(0.99),
+            "rtt_p999": self.rtt_quantiles.quantile(0.999),
+            "rtt_max": self.rtt.max,
+            "goodput_windows": rates.count,
+            "goodput_mean": rates.mean,
+            "goodput_std": rates.std,
+            "goodput_min": rates.min,
+            "goodput_max": rates.max,
+            "received_in_order": self.goodput.total,
+        }
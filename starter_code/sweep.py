@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Parameter sweeps for the SlidingWindowHost, e.g., to draw congestion collapse
+curves over several seeds at once.
+
+A sweep is the cartesian product of window sizes, seeds, rtt_min values, loss
+ratios and queue limits. Every point of the grid is an independent simulation,
+so the points are farmed out to a pool of worker processes. Each point carries
+its own seed and Simulator derives its random number streams from it, so a
+point produces the same result no matter which worker runs it or in what order.
+Results are appended to a CSV file as soon as each point finishes, and can
+also be saved to a NumPy .npz file (sorted by grid index) once the sweep is done.
+
+With a precision, each point stops as soon as its goodput is known to within
+that precision (see steady_state.py), and ticks is only the maximum. ticks_used
+records how far each point actually ran.
+
+Points already in the result cache (see result_cache.py) are not simulated
+again; the cache is shared with the simulator command line.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import os
+
+from result_cache import DEFAULT_PATH, ResultCache, run_config
+from simulator import Simulator
+from sliding_window_host import SlidingWindowHost
+from steady_state import SteadyStateMonitor
+
+# Columns of a sweep result, in CSV order
+FIELDS = [
+    "index",
+    "window_size",
+    "seed",
+    "rtt_min",
+    "loss_ratio",
+    "queue_limit",
+    "ticks",
+    "precision",
+    "ticks_used",
+    "goodput",
+    "in_order_rx_seq",
+]
+
+# Window in ticks over which points with a precision sample their goodput
+STEADY_INTERVAL = 1000
+
+
+def make_grid(
+    window_sizes, seeds, rtt_mins, loss_ratios, queue_limits, ticks, precision=0.0
+):
+    """
+    Return the list of sweep points, one dict per combination of parameters.
+    A precision of 0 runs every point for ticks ticks.
+    """
+    grid = []
+    combos = itertools.product(
+        window_sizes, seeds, rtt_mins, loss_ratios, queue_limits
+    )
+    for index, (window_size, seed, rtt_min, loss_ratio, queue_limit) in enumerate(
+        combos
+    ):
+        grid.append(
+            {
+                "index": index,
+                "window_size": window_size,
+                "seed": seed,
+                "rtt_min": rtt_min,
+                "loss_ratio": loss_ratio,
+                "queue_limit": queue_limit,
+                "ticks": ticks,
+                "precision": precision,
+            }
+        )
+    return grid
+
+
+def point_config(point):
+    """
+    Return the result cache configuration of a sweep point, the same as that of
+    the equivalent simulator.py command line.
+    """
+    return run_config(
+        "slidingwindow",
+        point["window_size"],
+        point["rtt_min"],
+        point["loss_ratio"],
+        point["queue_limit"],
+        point["seed"],
+        point["ticks"],
+        capacity=1,
+        jitter=0,
+        gilbert_elliott=None,
+        loss_trace=None,
+        precision=point["precision"] or None,
+        steady_interval=STEADY_INTERVAL,
+        pacing_gain=None,
+    )
+
+
+def simulate_point(point):
+    """
+    Simulate a single sweep point. Returns the run's result in the result
+    cache's format: in_order_rx_seq, ticks_used and, with a precision, the
+    steady_state estimate.
+    """
+    host = SlidingWindowHost(point["window_size"], verbose=False)
+    simulator = Simulator(
+        host,
+        point["loss_ratio"],
+        point["queue_limit"],
+        point["rtt_min"],
+        point["seed"],
+        verbose=False,
+    )
+    run = {"steady_state": None}
+    if point["precision"] > 0:
+        monitor = SteadyStateMonitor(STEADY_INTERVAL, point["precision"])
+        run["ticks_used"] = simulator.run_until_steady(
+            point["ticks"], monitor, event_driven=True
+        )
+        run["steady_state"] = monitor.estimate()
+    else:
+        simulator.run(point["ticks"])
+        run["ticks_used"] = point["ticks"]
+    run["in_order_rx_seq"] = simulator.host.in_order_rx_seq
+    return run
+
+
+def point_result(point, run):
+    # The point with the result of its run filled in
+    result = dict(point)
+    result["ticks_used"] = run["ticks_used"]
+    if run["steady_state"] is not None:
+        result["goodput"] = run["steady_state"]["goodput"]
+    else:
+        result["goodput"] = (run["in_order_rx_seq"] + 1) / run["ticks_used"]
+    result["in_order_rx_seq"] = run["in_order_rx_seq"]
+    return result
+
+
+def run_point(point):
+    """
+    Simulate a single sweep point and return it with its result filled in.
+    """
+    return point_result(point, simulate_point(point))
+
+
+def run_sweep(grid, workers=None, csv_path=None, npz_path=None, cache=None):
+    """
+    Run every point of grid on a pool of workers processes (one per CPU by
+    default) and return the results sorted by grid index.
+
+    Args:
+
+        **grid**: List of sweep points, as returned by make_grid
+
+        **workers**: Number of worker processes; 1 runs the sweep in-process
+
+        **csv_path**: If given, each result is appended to this CSV file as
+        soon as it is available
+
+        **npz_path**: If given, all results are saved to this .npz file at
+        the end, one array per column
+
+        **cache**: If given, a ResultCache that is consulted before simulating
+        a point and that stores the result of every point simulated
+    """
+    results = []
+    csv_file = None
+    writer = None
+    if csv_path is not None:
+        csv_file = open(csv_path, "w", newline="")
+        writer = csv.DictWriter(csv_file, fieldnames=FIELDS)
+        writer.writeheader()
+    # points served from the cache and points left to simulate
+    cached = []
+    missing = []
+    for point in grid:
+        run = cache.get(point_config(point)) if cache is not None else None
+        if run is None:
+            missing.append(point)
+        else:
+            cached.append((point, run))
+    pool = None
+    try:
+        if workers == 1:
+            simulated = ((point, simulate_point(point)) for point in missing)
+        else:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers or os.cpu_count()
+            )
+            futures = {pool.submit(simulate_point, point): point for point in missing}
+            simulated = (
+                (futures[future], future.result())
+                for future in concurrent.futures.as_completed(futures)
+            )
+        for point, run in itertools.chain(cached, simulated):
+            result = point_result(point, run)
+            results.append(result)
+            if writer is not None:
+                writer.writerow(result)
+                csv_file.flush()
+            if cache is not None and len(results) > len(cached):
+                # a freshly simulated point
+                cache.put(point_config(point), run)
+    finally:
+        if pool is not None:
+            # do not leave workers running if a point or the CSV writer failed
+            pool.shutdown(cancel_futures=True)
+        if csv_file is not None:
+            csv_file.close()
+
+    results.sort(key=lambda result: result["index"])
+    if npz_path is not None:
+        import numpy as np
+
+        np.savez(
+            npz_path,
+            **{
+                field: np.array([result[field] for result in results])
+                for field in FIELDS
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a grid of SlidingWindowHost simulations in parallel"
+    )
+    parser.add_argument("--window_sizes", type=int, nargs="+", required=True)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1000])
+    parser.add_argument("--rtt_min", type=int, nargs="+", default=[10])
+    parser.add_argument("--loss_ratio", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--queue_limit", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--ticks", type=int, default=10000)
+    parser.add_argument(
+        "--precision",
+        type=float,
+        default=0.0,
+        help="stop each point once its goodput is known to within this relative precision; --ticks becomes the maximum",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="number of worker processes, default one per CPU"
+    )
+    parser.add_argument("--csv", dest="csv_path", help="CSV file to stream results to")
+    parser.add_argument("--npz", dest="npz_path", help="NumPy .npz file to save results to")
+    parser.add_argument(
+        "--cache", default=DEFAULT_PATH, help="SQLite file caching the results of points"
+    )
+    parser.add_argument(
+        "--no_cache", action="store_true", help="simulate every point, bypassing the cache"
+    )
+    args = parser.parse_args()
+
+    grid = make_grid(
+        args.window_sizes,
+        args.seeds,
+        args.rtt_min,
+        args.loss_ratio,
+        args.queue_limit,
+        args.ticks,
+        args.precision,
+    )
+    cache = None if args.no_cache else ResultCache(args.cache)
+    for result in run_sweep(grid, args.workers, args.csv_path, args.npz_path, cache):
+        print(",".join(str(result[field]) for field in FIELDS))
@@ -1,3 +1,6 @@
+import event_trace
+
+
 class TimeoutCalculator:
     # default values for minimum and maximum timeout
     MIN_TIMEOUT = 100
@@ -8,7 +11,7 @@ class TimeoutCalculator:
      (which have the same meaning as discussed in the lectures)
     """
 
-    def __init__(self, min_timeout, max_timeout, verbose=True):
+    def __init__(self, min_timeout, max_timeout, verbose=True, tracer=None):
         # minimum possible timeout
         self.min_timeout = min_timeout
         # maximum possible timeout
@@ -27,6 +30,8 @@ class TimeoutCalculator:
         self.ewma_init = False
         # Whether to print output
         self.verbose = verbose
+        # Where to record events; echoes them as text if verbose
+        self.tracer = event_trace.default_tracer(tracer, verbose)
 
     def update_timeout(self, rtt_sample):
         """
@@ -47,7 +52,8 @@ class TimeoutCalculator:
         else:
             pass
             # TODO: Update RTT var based on rtt_sample and old mean RTT
-            self.rtt_var = (1-self.beta)*self.rtt_var + self.beta* (rtt_sample - self.mean_rtt)
+            # (the mean deviation, so that it never goes negative)
+            self.rtt_var = (1-self.beta)*self.rtt_var + self.beta* abs(rtt_sample - self.mean_rtt)
 
             # TODO: Update mean RTT based on rtt_sample
             self.mean_rtt = (1- self.alpha)* self.mean_rtt + self.alpha* rtt_sample
@@ -64,9 +70,10 @@ class TimeoutCalculator:
         # i.e, if your timeout is above self.max_timeout, you should set it to self.max_timeout.
         # and  if it's below self.min_timeout, you should set it to self.min_timeout
 
-    def exp_backoff(self):
+    def exp_backoff(self, tick=-1):
         """
-        This function is used to double the timeout representing an exponential backoff
+        This function is used to double the timeout representing an exponential backoff.
+        tick is only used to timestamp the backoff in the event trace.
         """
         pass
         # TODO: Exponentially back off by doubling the timeout
@@ -75,7 +82,6 @@ class TimeoutCalculator:
  
 
         self.ewma_init= False
-        print("exponential backoff here, re-initializing EWMA")
         # TODO: Before you return from this function,
         # ensure that updated timeout is between self.min_timeout and self.max_timeout
         # i.e, if your timeout is above self.max_timeout, you should set it to self.max_timeout.
@@ -84,7 +90,8 @@ class TimeoutCalculator:
             self.timeout = self.max_timeout
         if self.timeout < self.min_timeout:
             self.timeout = self.min_timeout
-        
+        if self.tracer.enabled:
+            self.tracer.record(event_trace.TIMER_BACKOFF, tick, value=self.timeout)
         
         return self.timeout
 
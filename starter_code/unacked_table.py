@@ -0,0 +1,109 @@
+import heapq
+
+
+class UnackedTable:
+    """
+    Bookkeeping for the unacked packets of a window-based host
+    (SlidingWindowHost, AimdHost). Data members of this class are
+
+    **packets**: Dict from sequence number to the unacked Packet with that
+    sequence number, in the order the packets were first sent
+
+    **timers**: Min-heap of (timeout_tick, seq_num, generation) entries, one
+    per scheduled retransmission timer
+
+    **generations**: Dict from sequence number to the generation of its live
+    heap entry; every timer pushed gets a new generation, so an entry is stale
+    as soon as its packet is rescheduled, even to the same timeout_tick
+
+    **next_generation**: Generation of the next timer pushed
+
+    Removing a packet when it is ACKed is a dict lookup, and finding the packets
+    that have timed out only looks at the top of the heap, so neither depends on
+    the window size. Heap entries of removed or rescheduled packets are not
+    deleted right away; they are skipped when they reach the top of the heap.
+    """
+
+    def __init__(self):
+        self.packets = {}
+        self.timers = []
+        self.generations = {}
+        self.next_generation = 0
+
+    def __len__(self):
+        return len(self.packets)
+
+    def __contains__(self, seq_num):
+        return seq_num in self.packets
+
+    def __iter__(self):
+        return iter(self.packets.values())
+
+    def get(self, seq_num):
+        """
+        Return the tracked packet with sequence number seq_num, or None.
+        """
+        return self.packets.get(seq_num)
+
+    def add(self, pkt):
+        """
+        Start tracking pkt, which times out at pkt.timeout_tick.
+        """
+        assert pkt.seq_num not in self.packets
+        self.packets[pkt.seq_num] = pkt
+        self.push_timer(pkt)
+
+    def remove(self, seq_num):
+        """
+        Stop tracking the packet with sequence number seq_num, e.g., because it
+        has been ACKed. Returns the packet, or None if it was not being tracked.
+        """
+        self.generations.pop(seq_num, None)
+        return self.packets.pop(seq_num, None)
+
+    def reschedule(self, pkt, timeout_tick):
+        """
+        Set a new timeout_tick for a tracked packet, e.g., after retransmitting it.
+        """
+        pkt.timeout_tick = timeout_tick
+        self.push_timer(pkt)
+
+    def pop_expired(self, tick):
+        """
+        Return the tracked packets whose timeout_tick is at or before tick, in
+        order of timeout_tick and then sequence number. Their timers are
+        consumed, so each of them must be given a new one with reschedule().
+        """
+        expired = []
+        while self.timers and self.timers[0][0] <= tick:
+            _, seq_num, generation = heapq.heappop(self.timers)
+            if self.generations.get(seq_num) == generation:
+                del self.generations[seq_num]
+                expired.append(self.packets[seq_num])
+        return expired
+
+    def next_timeout(self):
+        """
+        Return the earliest timeout_tick of all tracked packets, or None if
+        there are no tracked packets.
+        """
+        while self.timers:
+            timeout_tick, seq_num, generation = self.timers[0]
+            if self.generations.get(seq_num) == generation:
+                return timeout_tick
+            heapq.heappop(self.timers)
+        return None
+
+    def push_timer(self, pkt):
+        generation = self.next_generation
+        self.next_generation += 1
+        self.generations[pkt.seq_num] = generation
+        heapq.heappush(self.timers, (pkt.timeout_tick, pkt.seq_num, generation))
+        # Stale entries accumulate when packets are ACKed before they time out;
+        # rebuild the heap from the live timers once they dominate it.
+        if len(self.timers) > 2 * len(self.packets) + 64:
+            self.timers = [
+                (self.packets[seq_num].timeout_tick, seq_num, generation)
+                for seq_num, generation in self.generations.items()
+            ]
+            heapq.heapify(self.timers)